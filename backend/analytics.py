@@ -0,0 +1,137 @@
+import csv
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model import SETPOINT_TOLERANCE
+
+
+def _read_log_columns(
+    filepath: str,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray | None]:
+    setpoints: list[float] = []
+    actuals: list[float] = []
+    steps: list[float] = []
+    elapsed_times: list[float] = []
+    with open(filepath, "r", newline="") as f:
+        reader = csv.DictReader(f)
+        has_step = "step" in (reader.fieldnames or [])
+        has_elapsed = "elapsed" in (reader.fieldnames or [])
+        for row in reader:
+            setpoints.append(float(row["setpoint"]))
+            actuals.append(float(row["actual"]))
+            steps.append(float(row["step"]) if has_step and row["step"] else np.nan)
+            elapsed_times.append(
+                float(row["elapsed"]) if has_elapsed and row["elapsed"] else np.nan
+            )
+
+    setpoint = np.asarray(setpoints, dtype=np.float64)
+    actual = np.asarray(actuals, dtype=np.float64)
+    step = np.asarray(steps, dtype=np.float64)
+    elapsed = np.asarray(elapsed_times, dtype=np.float64)
+    if np.isnan(step).any():
+        # Logs written before the step column existed: split on setpoint changes
+        changes = np.r_[False, setpoint[1:] != setpoint[:-1]]
+        step = np.cumsum(changes).astype(np.float64)
+    # Logs written before the elapsed column existed: one sample per second
+    return setpoint, actual, step, None if np.isnan(elapsed).any() else elapsed
+
+
+def compute_step_statistics(
+    setpoint: np.ndarray,
+    actual: np.ndarray,
+    step: np.ndarray,
+    tolerance: float = SETPOINT_TOLERANCE,
+    elapsed: np.ndarray | None = None,
+) -> list[dict[str, float | int | None]]:
+    n = len(setpoint)
+    if n == 0:
+        return []
+
+    starts = np.flatnonzero(np.r_[True, step[1:] != step[:-1]])
+    counts = np.diff(np.r_[starts, n])
+    if elapsed is None:
+        elapsed = np.arange(n) - np.repeat(starts, counts)
+    elapsed = elapsed.astype(np.int64)
+    # Larger than any elapsed time, for the reductions below
+    never = int(elapsed.max()) + 1
+
+    error = actual - setpoint
+    abs_error = np.abs(error)
+    in_band = abs_error <= tolerance
+
+    mean_error = np.add.reduceat(abs_error, starts) / counts
+    rms_error = np.sqrt(np.add.reduceat(error * error, starts) / counts)
+    max_error = np.maximum.reduceat(abs_error, starts)
+
+    direction = np.where(setpoint[starts] >= actual[starts], 1.0, -1.0)
+    overshoot = np.maximum(
+        np.maximum.reduceat(np.repeat(direction, counts) * error, starts), 0.0
+    )
+
+    first_in_band = np.minimum.reduceat(np.where(in_band, elapsed, never), starts)
+    # Index of the last out-of-band sample in each step, or the index before
+    # the step starts when every sample is in band
+    index = np.arange(n)
+    last_out_of_band = np.maximum.reduceat(
+        np.where(in_band, np.repeat(starts, counts) - 1, index), starts
+    )
+
+    results = []
+    for i in range(len(starts)):
+        # Settled at the first in-band sample after the last out-of-band one
+        settled_index = last_out_of_band[i] + 1
+        if settled_index == starts[i] + counts[i]:
+            settling_time = None
+        else:
+            settling_time = int(elapsed[settled_index])
+        results.append(
+            {
+                "step": int(step[starts[i]]),
+                "samples": int(counts[i]),
+                "mean_error": float(mean_error[i]),
+                "max_error": float(max_error[i]),
+                "rms_error": float(rms_error[i]),
+                "overshoot": float(overshoot[i]),
+                "time_to_setpoint": (
+                    int(first_in_band[i]) if first_in_band[i] < never else None
+                ),
+                "settling_time": settling_time,
+            }
+        )
+    return results
+
+
+def analyze_log_file(
+    filepath: str, tolerance: float = SETPOINT_TOLERANCE
+) -> list[dict[str, float | int | None]]:
+    setpoint, actual, step, elapsed = _read_log_columns(filepath)
+    return compute_step_statistics(setpoint, actual, step, tolerance, elapsed)
+
+
+def analyze_log_files(
+    filepaths: list[str],
+    tolerance: float = SETPOINT_TOLERANCE,
+    max_workers: int | None = None,
+) -> dict[str, list[dict[str, float | int | None]]]:
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(
+            analyze_log_file,
+            filepaths,
+            [tolerance] * len(filepaths),
+            chunksize=max(1, len(filepaths) // 32),
+        )
+        return dict(zip(filepaths, results))
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(
+        glob.glob(
+            os.path.join(os.path.dirname(__file__), "data/temperature_logs/*.csv")
+        )
+    )
+    print(json.dumps(analyze_log_files(paths), indent=2))
@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from model import Procedure, ProcedureStep, RuntimeProcedureState, Temperature
+from repository import JsonProcedureRepository, ThreadedProcedureRepository
+from serial_device import MockSerialDevice, RealSerialDevice, crc16
+from services import ProcedureExecutionService, ProcedureService
+from temperature_logger import TemperatureLogger
+
+MIN_REPEAT_SECONDS = 0.05
+
+# A callable, or a (callable, setup) pair whose setup runs before each timed batch
+Benchmark = Callable[[], object] | tuple[Callable[[], object], Callable[[], object]]
+
+
+class LoopbackSerial:
+    def __init__(self, response: bytes):
+        self.is_open = True
+        self.timeout = None
+        self._response = response
+
+    def write(self, data: bytes) -> int:
+        return len(data)
+
+    def read(self, size: int) -> bytes:
+        return self._response[:size]
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+def _make_procedure(steps: int) -> Procedure:
+    return Procedure(
+        name=f"Benchmark {steps} steps",
+        steps=[
+            ProcedureStep(temperature=Temperature(20 + i % 200), duration=60)
+            for i in range(steps)
+        ],
+    )
+
+
+def _read_response(actual: float, setpoint: float) -> bytes:
+    frame = bytearray([0x01, 0x03, 0x06])
+    frame += int(actual * 10).to_bytes(2, "big")
+    frame += (0).to_bytes(2, "big")
+    frame += int(setpoint * 10).to_bytes(2, "big")
+    return bytes(frame + crc16(frame))
+
+
+def measure(
+    func: Callable[[], object],
+    repeat: int = 5,
+    setup: Callable[[], object] | None = None,
+) -> dict[str, float]:
+    number = 1
+    while True:
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_REPEAT_SECONDS or number >= 1 << 20:
+            break
+        number *= 10 if elapsed < MIN_REPEAT_SECONDS / 10 else 2
+
+    timings = [elapsed / number]
+    for _ in range(repeat - 1):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - started) / number)
+
+    median = statistics.median(timings)
+    return {
+        "median": median,
+        "min": min(timings),
+        "ops_per_sec": 1 / median if median else float("inf"),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def _run_async(coroutine_factory: Callable[[], object]) -> Callable[[], object]:
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(coroutine_factory())
+
+
+def serial_benchmarks() -> dict[str, Benchmark]:
+    request = bytes([0x01, 0x03, 0x20, 0x00, 0x00, 0x03])
+    device = RealSerialDevice("loopback")
+    device._serial = LoopbackSerial(_read_response(123.4, 150.0))
+
+    async def read_temperature_frame() -> Temperature:
+        # Skip the one-second cache so every call exchanges and parses a frame
+        device._last_update_time = 0
+        return await device.read_temperature()
+
+    return {
+        "crc16/request_frame": lambda: crc16(request),
+        "serial/read_temperature_frame": _run_async(read_temperature_frame),
+    }
+
+
+def temperature_benchmarks() -> dict[str, Benchmark]:
+    a = Temperature(123.4)
+    b = Temperature(56.7)
+    return {
+        "temperature/construct": lambda: Temperature(123.4),
+        "temperature/add": lambda: a + b,
+        "temperature/sub": lambda: a - b,
+        "temperature/mul": lambda: a * 1.5,
+        "temperature/truediv": lambda: a / 10,
+        "temperature/float_celsius": lambda: a.float_celsius,
+    }
+
+
+def runtime_state_benchmarks() -> dict[str, Benchmark]:
+    benchmarks = {}
+    for steps in (10, 100, 1000):
+        state = RuntimeProcedureState(_make_procedure(steps))
+        benchmarks[f"runtime_state/to_dict/{steps}"] = state.to_dict
+    return benchmarks
+
+
+def repository_benchmarks(work_dir: str) -> dict[str, Benchmark]:
+    benchmarks = {}
+    for count in (100, 1000, 10000):
+        repository = JsonProcedureRepository(
+            os.path.join(work_dir, f"repository_{count}", "procedures.json")
+        )
+        procedures = [_make_procedure(3) for _ in range(count)]
+        repository.save_all(procedures)
+        updated = Procedure(
+            "Updated", procedures[count // 2].steps, procedures[count // 2].id
+        )
+
+        def load_all_uncached(r: JsonProcedureRepository = repository):
+            # Parse the file every time rather than measuring a cache hit
+            r._cache = None
+            return r.load_all()
+
+        benchmarks[f"repository/load_all/{count}"] = load_all_uncached
+        benchmarks[f"repository/update/{count}"] = lambda r=repository, p=updated: (
+            r.update(p)
+        )
+        # Each timed batch starts again from the stated library size
+        benchmarks[f"repository/add/{count}"] = (
+            lambda r=repository: r.add(_make_procedure(3)),
+            lambda r=repository, p=procedures: r.save_all(p),
+        )
+    return benchmarks
+
+
+def logger_benchmarks(work_dir: str) -> dict[str, Benchmark]:
+    temperature_logger = TemperatureLogger(
+        data_dir=os.path.join(work_dir, "temperature_logs"),
+        rollup_dir=os.path.join(work_dir, "temperature_rollups"),
+    )
+    temperature_logger.start_new_log("benchmark", "Benchmark")
+    setpoint = Temperature(150)
+    actual = Temperature(149.8)
+    return {
+        "logger/log_temperature": lambda: temperature_logger.log_temperature(
+            "benchmark", setpoint, actual, step=0
+        ),
+    }
+
+
+def service_benchmarks(work_dir: str) -> dict[str, Benchmark]:
+    repository = ThreadedProcedureRepository(
+        JsonProcedureRepository(os.path.join(work_dir, "service", "procedures.json"))
+    )
+    repository.repository.save_all([_make_procedure(10) for _ in range(100)])
+    execution_service = ProcedureExecutionService(
+        repository,
+        MockSerialDevice(),
+        TemperatureLogger(
+            data_dir=os.path.join(work_dir, "service_logs"),
+            rollup_dir=os.path.join(work_dir, "service_rollups"),
+        ),
+    )
+    procedure_service = ProcedureService(repository, execution_service)
+    return {"service/get_all/100": _run_async(procedure_service.get_all)}
+
+
+def run_benchmarks(name_filter: str | None, repeat: int) -> dict[str, dict]:
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        benchmarks = {
+            **serial_benchmarks(),
+            **temperature_benchmarks(),
+            **runtime_state_benchmarks(),
+            **repository_benchmarks(work_dir),
+            **logger_benchmarks(work_dir),
+            **service_benchmarks(work_dir),
+        }
+        for name, benchmark in benchmarks.items():
+            if name_filter and name_filter not in name:
+                continue
+            func, setup = (
+                benchmark if isinstance(benchmark, tuple) else (benchmark, None)
+            )
+            results[name] = measure(func, repeat, setup)
+            print(
+                f"{name:40s} {results[name]['median'] * 1e6:12.2f} us/op",
+                file=sys.stderr,
+            )
+    return results
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict], threshold: float):
+    regressions = []
+    print(f"{'benchmark':40s} {'baseline':>12s} {'current':>12s} {'ratio':>8s}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        marker = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            marker = "  REGRESSION"
+        print(
+            f"{name:40s} {baseline[name]['median'] * 1e6:10.2f}us "
+            f"{result['median'] * 1e6:10.2f}us {ratio:8.2f}{marker}"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark backend hot paths")
+    parser.add_argument("--filter", help="only run benchmarks containing this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a saved results file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="relative slowdown reported as a regression",
+    )
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "results": run_benchmarks(args.filter, args.repeat),
+    }
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        if compare(report["results"], baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
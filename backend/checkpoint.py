@@ -0,0 +1,114 @@
+import json
+import os
+import struct
+from dataclasses import dataclass
+from datetime import datetime
+from typing import IO
+
+from model import Procedure, ProcedureStep, Temperature
+
+# step index, elapsed seconds in the step, byte offset into the run's log file
+CHECKPOINT_STRUCT = struct.Struct("<IIQ")
+
+
+@dataclass
+class InterruptedRun:
+    procedure: Procedure
+    log_file: str
+    started_at: str
+    step: int
+    elapsed: int
+    log_offset: int
+
+    def to_dict(self) -> dict:
+        return {
+            "procedure": dict(self.procedure),
+            "log_file": self.log_file,
+            "started_at": self.started_at,
+            "step": self.step,
+            "elapsed": self.elapsed,
+        }
+
+
+class CheckpointJournal:
+    # A JSON header line describing the run, followed by fixed-size binary
+    # checkpoint records. Only the last complete record matters on resume.
+    def __init__(
+        self,
+        file_path: str = "data/checkpoints/active_run.journal",
+        interval: int = 10,
+    ):
+        self.file_path = file_path
+        self.interval = max(1, interval)
+        self._handle: IO[bytes] | None = None
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+
+    def begin(self, procedure: Procedure, log_file: str, started_at: datetime) -> None:
+        self.close()
+        header = {
+            "procedure": dict(procedure),
+            "log_file": log_file,
+            "started_at": started_at.isoformat(),
+        }
+        self._handle = open(self.file_path, "wb")
+        self._handle.write(json.dumps(header, separators=(",", ":")).encode() + b"\n")
+        self._handle.flush()
+
+    def resume(self) -> None:
+        self.close()
+        self._handle = open(self.file_path, "ab")
+
+    def is_due(self, elapsed: int) -> bool:
+        return elapsed % self.interval == 0
+
+    def record(self, step: int, elapsed: int, log_offset: int) -> None:
+        if self._handle:
+            self._handle.write(CHECKPOINT_STRUCT.pack(step, elapsed, log_offset))
+            self._handle.flush()
+
+    def close(self) -> None:
+        if self._handle:
+            self._handle.close()
+        self._handle = None
+
+    def clear(self) -> None:
+        self.close()
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+
+    def load(self) -> InterruptedRun | None:
+        if not os.path.exists(self.file_path):
+            return None
+        with open(self.file_path, "rb") as f:
+            header_line = f.readline()
+            records = f.read()
+
+        count = len(records) // CHECKPOINT_STRUCT.size
+        if not count:
+            return None
+        try:
+            header = json.loads(header_line)
+        except ValueError:
+            return None
+        step, elapsed, log_offset = CHECKPOINT_STRUCT.unpack_from(
+            records, (count - 1) * CHECKPOINT_STRUCT.size
+        )
+        procedure = Procedure(
+            name=header["procedure"]["name"],
+            steps=[
+                ProcedureStep(
+                    temperature=Temperature(step_dict["temperature"]),
+                    duration=step_dict["duration"],
+                )
+                for step_dict in header["procedure"]["steps"]
+            ],
+            id=header["procedure"]["id"],
+        )
+        return InterruptedRun(
+            procedure=procedure,
+            log_file=header["log_file"],
+            started_at=header["started_at"],
+            step=step,
+            elapsed=elapsed,
+            log_offset=log_offset,
+        )
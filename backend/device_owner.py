@@ -0,0 +1,279 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from datetime import datetime
+from typing import Any, Awaitable, Callable
+
+from checkpoint import CheckpointJournal
+from metrics import registry
+from model import Temperature
+from repository import JsonProcedureRepository, ThreadedProcedureRepository
+from serial_device import (
+    MockSerialDevice,
+    RealSerialDevice,
+    ReplaySerialDevice,
+    SerialDevice,
+)
+from services import ProcedureExecutionService, ProcedureService
+from telemetry import STATUS_CHANNEL, TelemetryService
+from temperature_logger import TemperatureLogger
+
+DEFAULT_SOCKET_PATH = "/tmp/temperature-controller.sock"
+# Backfill and history replies are single JSON lines well above the 64 KiB default
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+def create_device() -> SerialDevice:
+    if os.environ.get("MOCK_DEVICE"):
+        return MockSerialDevice()
+    if os.environ.get("SERIAL_REPLAY"):
+        return ReplaySerialDevice(
+            os.environ["SERIAL_REPLAY"],
+            speed=float(os.environ.get("SERIAL_REPLAY_SPEED", "1.0")),
+        )
+    return RealSerialDevice(
+        os.environ.get("SERIAL_PORT", "COM5"),
+        trace_path=os.environ.get("SERIAL_TRACE"),
+    )
+
+
+def encode_line(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class DeviceOwnerServer:
+    def __init__(
+        self,
+        socket_path: str,
+        device: SerialDevice,
+        execution_service: ProcedureExecutionService,
+        telemetry_service: TelemetryService,
+        temperature_logger: TemperatureLogger,
+    ):
+        self._socket_path = socket_path
+        self._device = device
+        self._execution_service = execution_service
+        self._telemetry_service = telemetry_service
+        self._temperature_logger = temperature_logger
+        self._server: asyncio.AbstractServer | None = None
+        self._subscribers: set[asyncio.StreamWriter] = set()
+        self._methods: dict[str, Callable[..., Awaitable[Any]]] = {
+            "status": self._device.status,
+            "is_connected": self._device.is_connected,
+            "connect": self._connect,
+            "disconnect": self._device.disconnect,
+            "change_port": self._change_port,
+            "read_temperature": self._read_temperature,
+            "set_temperature": self._set_temperature,
+            "start_procedure": self._execution_service.start_procedure,
+            "stop_procedure": self._execution_service.stop_procedure,
+            "reset_active_procedure": self._execution_service.reset_active_procedure,
+            "get_interrupted_run": self._execution_service.get_interrupted_run,
+            "resume_procedure": self._execution_service.resume_procedure,
+            "discard_interrupted_run": self._execution_service.discard_interrupted_run,
+            "query_history": self._query_history,
+            "metrics": self._metrics,
+        }
+
+    async def start(self) -> None:
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, path=self._socket_path, limit=STREAM_LIMIT
+        )
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+            for writer in list(self._subscribers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+    def _snapshot(self) -> dict:
+        active_procedure = self._execution_service.get_active_procedure()
+        return {
+            "port": self._device.port,
+            "version": self._execution_service.get_state_version(),
+            "procedure": active_procedure.to_dict() if active_procedure else None,
+            "backfill": self._telemetry_service.backfill_message(),
+        }
+
+    def _broadcast(self, message: dict) -> None:
+        line = encode_line(message)
+        for writer in self._subscribers:
+            writer.write(line)
+
+    async def _connect(self, port: str | None = None) -> None:
+        await self._device.connect(port)
+        self._broadcast({"event": "port", "port": self._device.port})
+
+    async def _change_port(self, port: str) -> None:
+        try:
+            await self._device.change_port(port)
+        finally:
+            self._broadcast({"event": "port", "port": self._device.port})
+
+    async def _read_temperature(self) -> float:
+        return (await self._device.read_temperature()).float_celsius
+
+    async def _set_temperature(self, temperature: float) -> None:
+        await self._device.set_temperature(Temperature(temperature))
+
+    async def _query_history(self, start: str, end: str, resolution: int) -> dict:
+        tier, records = self._temperature_logger.query_history(
+            datetime.fromisoformat(start), datetime.fromisoformat(end), resolution
+        )
+        return {"resolution": tier, "records": records}
+
+    async def _metrics(self) -> str:
+        return registry.render()
+
+    async def _forward_telemetry(self, writer: asyncio.StreamWriter) -> None:
+        subscription = self._telemetry_service.subscribe(
+            {STATUS_CHANNEL, *self._telemetry_service.channels}
+        )
+        try:
+            while True:
+                channel, message = await subscription.queue.get()
+                writer.write(
+                    encode_line(
+                        {"event": "telemetry", "channel": channel, "data": message}
+                    )
+                )
+                await writer.drain()
+        finally:
+            self._telemetry_service.unsubscribe(subscription)
+
+    async def _forward_state(self, writer: asyncio.StreamWriter, version: int) -> None:
+        while True:
+            version = await self._execution_service.wait_for_state_change(version)
+            active_procedure = self._execution_service.get_active_procedure()
+            writer.write(
+                encode_line(
+                    {
+                        "event": "state",
+                        "version": version,
+                        "procedure": (
+                            active_procedure.to_dict() if active_procedure else None
+                        ),
+                    }
+                )
+            )
+            await writer.drain()
+
+    async def _dispatch(
+        self, request: dict, writer: asyncio.StreamWriter, tasks: set[asyncio.Task]
+    ) -> None:
+        request_id = request.get("id")
+        method = request.get("method")
+        try:
+            if method == "subscribe":
+                result = self._snapshot()
+            elif method in self._methods:
+                result = await self._methods[method](**request.get("params", {}))
+            else:
+                raise ValueError(f"Unknown method {method}")
+            reply = {"id": request_id, "result": result}
+        except Exception as e:
+            reply = {
+                "id": request_id,
+                "error": {
+                    "type": type(e).__name__,
+                    # Lets the worker fall back to the nearest class it knows
+                    "bases": [cls.__name__ for cls in type(e).__mro__[1:]],
+                    "message": str(e),
+                },
+            }
+        writer.write(encode_line(reply))
+
+        # Events start after the snapshot so the worker never sees them out of order
+        if method == "subscribe" and writer not in self._subscribers:
+            self._subscribers.add(writer)
+            tasks.add(asyncio.create_task(self._forward_telemetry(writer)))
+            tasks.add(
+                asyncio.create_task(self._forward_state(writer, result["version"]))
+            )
+        await writer.drain()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        # Requests on one connection run concurrently so a long call such as
+        # stop_procedure does not hold up the worker's other requests
+        tasks: set[asyncio.Task] = set()
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                task = asyncio.create_task(self._dispatch(request, writer, tasks))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._subscribers.discard(writer)
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+
+async def serve(socket_path: str) -> None:
+    device = create_device()
+    procedure_repository = ThreadedProcedureRepository(JsonProcedureRepository())
+    temperature_logger = TemperatureLogger()
+    execution_service = ProcedureExecutionService(
+        procedure_repository,
+        device,
+        temperature_logger,
+        checkpoint_journal=CheckpointJournal(
+            interval=int(os.environ.get("CHECKPOINT_INTERVAL", "10"))
+        ),
+    )
+    # Seeds the default procedures before any API worker reads the library
+    await ProcedureService(procedure_repository, execution_service).initialize()
+    telemetry_service = TelemetryService(
+        device,
+        execution_service,
+        shared_memory_name=os.environ.get("TELEMETRY_SHM"),
+    )
+    server = DeviceOwnerServer(
+        socket_path, device, execution_service, telemetry_service, temperature_logger
+    )
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    telemetry_service.start()
+    await server.start()
+    print(f"Device owner listening on {socket_path}")
+    await stopped.wait()
+
+    await server.stop()
+    await telemetry_service.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Own the serial device and procedure execution for API workers"
+    )
+    parser.add_argument(
+        "--socket",
+        default=os.environ.get("DEVICE_OWNER_SOCKET", DEFAULT_SOCKET_PATH),
+    )
+    args = parser.parse_args()
+    asyncio.run(serve(args.socket))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
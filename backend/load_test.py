@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+
+import httpx
+import uvicorn
+from websockets.asyncio.client import connect
+
+
+@dataclass
+class PhaseStats:
+    intervals: list[float] = field(default_factory=list)
+    latencies: list[float] = field(default_factory=list)
+    rest_latencies: list[float] = field(default_factory=list)
+    rest_errors: int = 0
+    connect_failures: int = 0
+    messages: int = 0
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _milliseconds(value: float | None) -> float | None:
+    return None if value is None else round(value * 1000, 3)
+
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+
+        # Peak rather than current RSS where /proc is unavailable
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class ServerThread(threading.Thread):
+    def __init__(self, port: int, data_dir: str):
+        super().__init__(name="load-test-server", daemon=True)
+        # main.py builds the app at import time, so configure it first
+        os.environ["MOCK_DEVICE"] = "1"
+        os.environ["DATA_DIR"] = data_dir
+        import main
+
+        self.server = uvicorn.Server(
+            uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning")
+        )
+
+    def run(self) -> None:
+        self.server.run()
+
+    def cpu_seconds(self) -> float:
+        try:
+            return time.clock_gettime(time.pthread_getcpuclockid(self.ident))
+        except (AttributeError, OSError):
+            # Falls back to the whole process, clients included
+            return time.process_time()
+
+    def wait_started(self, timeout: float = 10) -> None:
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.join()
+
+
+async def websocket_client(url: str, stats: PhaseStats, ready: asyncio.Event):
+    try:
+        websocket = await connect(url, max_size=None, open_timeout=30)
+    except Exception:
+        stats.connect_failures += 1
+        ready.set()
+        return
+
+    async with websocket:
+        last_received = None
+        ready.set()
+        async for raw in websocket:
+            received = time.time()
+            message = json.loads(raw)
+            data = message.get("data")
+            if not data or data.get("type") == "backfill" or "timestamp" not in data:
+                continue
+            stats.messages += 1
+            stats.latencies.append(received - data["timestamp"])
+            if last_received is not None:
+                stats.intervals.append(received - last_received)
+            last_received = received
+
+
+async def rest_client(base_url: str, rate: float, stats: PhaseStats):
+    procedure = {
+        "name": "Load test",
+        "steps": [{"temperature": 50, "duration": 10}],
+    }
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        while True:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/procedures", json=procedure)
+                created = response.json()["procedure"]
+                await client.get("/procedures")
+                await client.delete(f"/procedures/{created['id']}")
+                stats.rest_latencies.append((time.perf_counter() - started) / 3)
+            except Exception:
+                stats.rest_errors += 1
+            await asyncio.sleep(max(0.0, 1 / rate - (time.perf_counter() - started)))
+
+
+async def run_phase(
+    server: ServerThread,
+    port: int,
+    clients: int,
+    duration: float,
+    rest_rate: float,
+    interval: float,
+) -> dict:
+    stats = PhaseStats()
+    url = f"ws://127.0.0.1:{port}/ws?channels=telemetry:default"
+    events = [asyncio.Event() for _ in range(clients)]
+    tasks = [
+        asyncio.create_task(websocket_client(url, stats, event)) for event in events
+    ]
+    await asyncio.gather(*(event.wait() for event in events))
+    # Let every client see at least one live message before measuring
+    await asyncio.sleep(interval * 1.5)
+    stats.intervals.clear()
+    stats.latencies.clear()
+    stats.messages = 0
+
+    if rest_rate > 0:
+        tasks.append(
+            asyncio.create_task(
+                rest_client(f"http://127.0.0.1:{port}", rest_rate, stats)
+            )
+        )
+
+    cpu_started = server.cpu_seconds()
+    wall_started = time.monotonic()
+    await asyncio.sleep(duration)
+    cpu_used = server.cpu_seconds() - cpu_started
+    wall = time.monotonic() - wall_started
+    rss = _rss_bytes()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    jitter = [abs(value - interval) for value in stats.intervals]
+    return {
+        "clients": clients,
+        "connect_failures": stats.connect_failures,
+        "messages": stats.messages,
+        "jitter_p50_ms": _milliseconds(percentile(jitter, 0.5)),
+        "jitter_p99_ms": _milliseconds(percentile(jitter, 0.99)),
+        "latency_p50_ms": _milliseconds(percentile(stats.latencies, 0.5)),
+        "latency_p99_ms": _milliseconds(percentile(stats.latencies, 0.99)),
+        "rest_requests": len(stats.rest_latencies) * 3,
+        "rest_errors": stats.rest_errors,
+        "rest_p50_ms": _milliseconds(percentile(stats.rest_latencies, 0.5)),
+        "rest_p99_ms": _milliseconds(percentile(stats.rest_latencies, 0.99)),
+        "server_cpu_percent": round(100 * cpu_used / wall, 1),
+        "rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+    }
+
+
+def print_table(results: list[dict]) -> None:
+    columns = [
+        "clients",
+        "connect_failures",
+        "jitter_p50_ms",
+        "jitter_p99_ms",
+        "latency_p50_ms",
+        "latency_p99_ms",
+        "rest_p50_ms",
+        "rest_p99_ms",
+        "server_cpu_percent",
+        "rss_mb",
+    ]
+    print("  ".join(f"{column:>18s}" for column in columns))
+    for result in results:
+        print("  ".join(f"{str(result[column]):>18s}" for column in columns))
+
+
+async def run(args: argparse.Namespace, data_dir: str) -> list[dict]:
+    server = ServerThread(args.port, data_dir)
+    server.start()
+    server.wait_started()
+    results = []
+    try:
+        for clients in args.clients:
+            result = await run_phase(
+                server, args.port, clients, args.duration, args.rest_rate, 1.0
+            )
+            print(json.dumps(result), file=sys.stderr)
+            results.append(result)
+    finally:
+        server.stop()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Load test the API in-process against a mock device"
+    )
+    parser.add_argument(
+        "--clients",
+        type=lambda value: [int(n) for n in value.split(",")],
+        default=[1, 10, 50, 100, 200, 500],
+        help="comma-separated WebSocket client counts to step through",
+    )
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument(
+        "--rest-rate", type=float, default=5, help="REST rounds per second"
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Keep procedures and logs created by the load test out of the real data
+    # directory
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = asyncio.run(run(args, work_dir))
+
+    print_table(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
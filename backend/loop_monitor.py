@@ -0,0 +1,139 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from metrics import EVENT_LOOP_LAG_SECONDS
+
+
+def _collapse_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_filename}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class LoopLagMonitor:
+    def __init__(
+        self, interval: float = 0.1, threshold: float = 0.25, max_snapshots: int = 20
+    ):
+        self._interval = interval
+        self._threshold = threshold
+        self._snapshots: deque[dict] = deque(maxlen=max_snapshots)
+        self._loop_thread_id: int | None = None
+        self._last_beat = time.monotonic()
+        self._stall_captured = False
+        self._max_lag = 0.0
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def loop_thread_id(self) -> int | None:
+        return self._loop_thread_id
+
+    def start(self) -> None:
+        if self._task:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-lag-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._watchdog = None
+
+    def status(self) -> dict:
+        return {
+            "interval": self._interval,
+            "threshold": self._threshold,
+            "max_lag": self._max_lag,
+            "slow_callbacks": list(self._snapshots),
+        }
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self._interval
+            await asyncio.sleep(self._interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            self._max_lag = max(self._max_lag, lag)
+            self._last_beat = now
+            self._stall_captured = False
+
+    def _watch(self) -> None:
+        # Runs off the loop so it can see the loop thread while it is blocked
+        while not self._stopped.wait(self._threshold / 2):
+            stalled_for = time.monotonic() - self._last_beat - self._interval
+            if stalled_for < self._threshold or self._stall_captured:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._stall_captured = True
+            self._snapshots.append(
+                {
+                    "timestamp": time.time(),
+                    "lag": stalled_for,
+                    "stack": traceback.format_stack(frame),
+                }
+            )
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, max_stacks: int = 50):
+        self._interval = interval
+        self._max_stacks = max_stacks
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _sample(self, thread_id: int, seconds: float) -> dict:
+        stacks: Counter[str] = Counter()
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                stacks[_collapse_stack(frame)] += 1
+                samples += 1
+            time.sleep(self._interval)
+        return {
+            "seconds": seconds,
+            "interval": self._interval,
+            "samples": samples,
+            "stacks": [
+                {"stack": stack, "count": count}
+                for stack, count in stacks.most_common(self._max_stacks)
+            ],
+        }
+
+    async def profile(self, seconds: float, thread_id: int | None = None) -> dict:
+        if self._running:
+            raise RuntimeError("Profiler is already running")
+        self._running = True
+        try:
+            return await asyncio.to_thread(
+                self._sample, thread_id or threading.get_ident(), seconds
+            )
+        finally:
+            self._running = False
@@ -1,20 +1,101 @@
 import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator
 from pydantic import BaseModel
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from repository import JsonProcedureRepository
-from serial_device import Temperature, RealSerialDevice
-
-# from serial_device import MockSerialDevice
+from checkpoint import CheckpointJournal
+from device_owner import create_device
+from loop_monitor import LoopLagMonitor, SamplingProfiler
+from metrics import WEBSOCKET_QUEUE_DEPTH, WEBSOCKET_SEND_SECONDS, registry
+from owner_client import (
+    DeviceOwnerClient,
+    RemoteExecutionService,
+    RemoteSerialDevice,
+    RemoteTelemetryService,
+    RemoteTemperatureLogger,
+)
+from port_discovery import SerialPortWatcher
+from repository import JsonProcedureRepository, ThreadedProcedureRepository
+from serial_device import Temperature
 from services import ProcedureService, ProcedureExecutionService
+from telemetry import STATUS_CHANNEL, TelemetryService, TelemetrySubscription
+from temperature_logger import TemperatureLogger
+from ws_protocol import encode_binary
+
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+
+# Procedures, temperature logs, rollups and checkpoints all live under here
+DATA_DIR = os.environ.get("DATA_DIR", "data")
 
-device = RealSerialDevice("COM5")
-# device = MockSerialDevice()
-procedure_repository = JsonProcedureRepository()
-procedure_execution_service = ProcedureExecutionService(procedure_repository, device)
+procedure_repository = ThreadedProcedureRepository(
+    JsonProcedureRepository(os.path.join(DATA_DIR, "procedures.json"))
+)
+owner_socket = os.environ.get("DEVICE_OWNER_SOCKET")
+if owner_socket:
+    # Device I/O and procedure execution live in device_owner.py, so any
+    # number of API workers can share the one serial port
+    owner = DeviceOwnerClient(owner_socket)
+    device = RemoteSerialDevice(owner)
+    temperature_logger = RemoteTemperatureLogger(owner)
+    procedure_execution_service = RemoteExecutionService(owner)
+    telemetry_service = RemoteTelemetryService(owner)
+else:
+    owner = None
+    device = create_device()
+    temperature_logger = TemperatureLogger(
+        data_dir=os.path.join(DATA_DIR, "temperature_logs"),
+        rollup_dir=os.path.join(DATA_DIR, "temperature_rollups"),
+    )
+    procedure_execution_service = ProcedureExecutionService(
+        procedure_repository,
+        device,
+        temperature_logger,
+        checkpoint_journal=CheckpointJournal(
+            os.path.join(DATA_DIR, "checkpoints", "active_run.journal"),
+            interval=int(os.environ.get("CHECKPOINT_INTERVAL", "10")),
+        ),
+    )
+    telemetry_service = TelemetryService(
+        device,
+        procedure_execution_service,
+        shared_memory_name=os.environ.get("TELEMETRY_SHM"),
+    )
 procedure_service = ProcedureService(procedure_repository, procedure_execution_service)
+port_watcher = SerialPortWatcher()
+loop_monitor = LoopLagMonitor()
+profiler = SamplingProfiler()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not owner:
+        # The device owner seeds the library; several workers seeding it at
+        # once would each add the example procedures
+        await procedure_service.initialize()
+    loop_monitor.start()
+    port_watcher.start()
+    telemetry_service.start()
+    yield
+    await telemetry_service.stop()
+    await port_watcher.stop()
+    await loop_monitor.stop()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,11 +131,15 @@ def read_root():
 
 @app.get("/serial-ports")
 def get_serial_ports():
-    return {"ports": ["COM1", "COM2", "COM3"]}
+    return {"ports": port_watcher.ports, "selected": device.port}
 
 
 @app.post("/select-serial-port")
-def set_serial_port(request: PortRequest):
+async def set_serial_port(request: PortRequest):
+    try:
+        await device.change_port(request.port)
+    except ConnectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"message": f"Serial port set to {request.port}"}
 
 
@@ -65,28 +150,91 @@ async def set_temperature(request: TemperatureRequest):
 
 
 @app.post("/procedures")
-def create_procedure(request: CreateProcedureRequest):
+async def create_procedure(request: CreateProcedureRequest):
     steps = [(step.temperature, step.duration) for step in request.steps]
-    return procedure_service.create(request.name, steps)
+    return await procedure_service.create(request.name, steps)
 
 
 @app.get("/procedures")
-def get_procedures():
-    return procedure_service.get_all()
+async def get_procedures(
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1, le=500),
+    name: str | None = None,
+):
+    # Without paging parameters the whole library is returned, as before
+    if cursor is None and limit is None and name is None:
+        return await procedure_service.get_all()
+    try:
+        return await procedure_service.list_page(cursor, limit or 50, name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/procedures/export")
+async def export_procedures():
+    async def ndjson_lines():
+        async for batch in procedure_service.export_batches():
+            yield "".join(
+                json.dumps(procedure, separators=(",", ":")) + "\n"
+                for procedure in batch
+            )
+
+    return StreamingResponse(
+        ndjson_lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="procedures.ndjson"'},
+    )
+
+
+async def _split_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    pending = b""
+    async for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield line
+        # Otherwise a body without newlines would be buffered whole
+        if len(pending) > MAX_IMPORT_LINE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Import line exceeds {MAX_IMPORT_LINE_BYTES} bytes",
+            )
+    if pending:
+        yield pending
+
+
+@app.post("/procedures/import")
+async def import_procedures(request: Request):
+    return await procedure_service.import_procedures(_split_lines(request.stream()))
+
+
+@app.get("/procedures/interrupted")
+async def get_interrupted_procedure():
+    return {"run": await procedure_execution_service.get_interrupted_run()}
+
+
+@app.post("/procedures/interrupted/resume")
+async def resume_interrupted_procedure():
+    return await procedure_execution_service.resume_procedure()
+
+
+@app.delete("/procedures/interrupted")
+async def discard_interrupted_procedure():
+    await procedure_execution_service.discard_interrupted_run()
+    return {"success": True, "message": "Interrupted run discarded"}
 
 
 @app.delete("/procedures/{procedure_id}")
-def delete_procedure(procedure_id: str):
-    result = procedure_service.delete(procedure_id)
+async def delete_procedure(procedure_id: str):
+    result = await procedure_service.delete(procedure_id)
     if not result["success"]:
         raise HTTPException(status_code=404, detail=result["message"])
     return result
 
 
 @app.put("/procedures/{procedure_id}")
-def update_procedure(procedure_id: str, request: CreateProcedureRequest):
+async def update_procedure(procedure_id: str, request: CreateProcedureRequest):
     steps = [(step.temperature, step.duration) for step in request.steps]
-    return procedure_service.update(procedure_id, request.name, steps)
+    return await procedure_service.update(procedure_id, request.name, steps)
 
 
 @app.post("/procedures/{procedure_id}/start")
@@ -95,8 +243,8 @@ async def start_procedure(procedure_id: str):
 
 
 @app.post("/procedures/{procedure_id}/reset")
-def reset_procedure(procedure_id: str):
-    result = procedure_service.reset_procedure(procedure_id)
+async def reset_procedure(procedure_id: str):
+    result = await procedure_service.reset_procedure(procedure_id)
     if not result["success"]:
         raise HTTPException(status_code=404, detail=result["message"])
     return result
@@ -107,9 +255,97 @@ async def stop_procedure():
     return await procedure_execution_service.stop_procedure()
 
 
+def _active_procedure_snapshot() -> dict:
+    active_procedure = procedure_execution_service.get_active_procedure()
+    return {
+        "version": procedure_execution_service.get_state_version(),
+        "procedure": active_procedure.to_dict() if active_procedure else None,
+    }
+
+
 @app.get("/procedures/active")
-def get_active_procedure():
-    return procedure_execution_service.get_active_procedure()
+async def get_active_procedure(since: int | None = None, timeout: float = 30):
+    # Plain requests keep the original bare response; only long-poll callers,
+    # who need the version for their next request, get the envelope
+    if since is None:
+        return procedure_execution_service.get_active_procedure()
+    await procedure_execution_service.wait_for_state_change(
+        since, min(max(timeout, 0), 60)
+    )
+    return _active_procedure_snapshot()
+
+
+@app.get("/procedures/active/events")
+async def stream_active_procedure(request: Request):
+    last_event_id = request.headers.get("last-event-id", "")
+
+    async def event_stream():
+        version = int(last_event_id) if last_event_id.isdigit() else None
+        while not await request.is_disconnected():
+            current_version = procedure_execution_service.get_state_version()
+            if current_version != version:
+                snapshot = _active_procedure_snapshot()
+                version = snapshot["version"]
+                data = json.dumps(snapshot["procedure"], separators=(",", ":"))
+                yield f"id: {version}\nevent: procedure\ndata: {data}\n\n"
+            elif (
+                await procedure_execution_service.wait_for_state_change(version, 15)
+                == version
+            ):
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/temperature-history")
+def get_temperature_history(
+    start: datetime | None = None,
+    end: datetime | None = None,
+    resolution: int = 60,
+):
+    end = end or datetime.now()
+    start = start or end - timedelta(days=1)
+    tier, records = temperature_logger.query_history(start, end, resolution)
+    return {"resolution": tier, "records": records}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/metrics/device-owner", response_class=PlainTextResponse)
+async def get_device_owner_metrics():
+    if not owner:
+        raise HTTPException(status_code=404, detail="No separate device owner")
+    try:
+        metrics = await owner.call("metrics")
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return PlainTextResponse(
+        metrics, media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/admin/loop-lag")
+def get_loop_lag():
+    return loop_monitor.status()
+
+
+@app.post("/admin/profile")
+async def run_profiler(seconds: float = 5):
+    try:
+        return await profiler.profile(
+            min(max(seconds, 0.1), 60), loop_monitor.loop_thread_id
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 class ConnectionManager:
@@ -128,22 +364,87 @@ class ConnectionManager:
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
 
-    async def send_message(self, websocket: WebSocket):
-        if not await device.is_connected():
-            await device.connect()
-
+    async def _send(
+        self, websocket: WebSocket, message_format: str, channel: str, message: dict
+    ):
+        started = time.perf_counter()
+        if message_format == "binary":
+            await websocket.send_bytes(
+                encode_binary(channel, message, {telemetry_service.channel: 0})
+            )
+        elif channel == STATUS_CHANNEL:
+            await websocket.send_json(message)
+        else:
+            await websocket.send_json({"channel": channel, "data": message})
+        WEBSOCKET_SEND_SECONDS.observe(
+            time.perf_counter() - started, format=message_format
+        )
+
+    def _queue_backfill(
+        self, subscription: TelemetrySubscription, channels: set[str]
+    ) -> None:
+        if telemetry_service.channel in channels:
+            subscription.put(
+                telemetry_service.channel, telemetry_service.backfill_message()
+            )
+
+    async def _receive_commands(
+        self, websocket: WebSocket, subscription: TelemetrySubscription
+    ):
+        while True:
+            try:
+                command = await websocket.receive_json()
+                channels = set(command.get("channels", [])) & set(
+                    telemetry_service.channels
+                )
+            # KeyError: receive_json() on a binary frame, which has no text
+            except (ValueError, AttributeError, TypeError, KeyError):
+                continue
+
+            if command.get("type") == "subscribe":
+                self._queue_backfill(subscription, channels - subscription.channels)
+                subscription.channels |= channels
+            elif command.get("type") == "unsubscribe":
+                subscription.channels -= channels
+
+    async def send_message(
+        self,
+        websocket: WebSocket,
+        message_format: str = "json",
+        channels: set[str] | None = None,
+    ):
+        subscription = telemetry_service.subscribe(channels)
+        client = (
+            f"{websocket.client.host}:{websocket.client.port}"
+            if websocket.client
+            else str(id(websocket))
+        )
+        receiver = asyncio.create_task(self._receive_commands(websocket, subscription))
         try:
-            while True:
-                if websocket.client_state.value == 3:  # WebSocket.DISCONNECTED
-                    break
-
-                status_data = await device.status()
-                active_procedure = procedure_execution_service.get_active_procedure()
-                if active_procedure:
-                    status_data["active_procedure"] = active_procedure.to_dict()
+            if channels is None:
+                await websocket.send_json(telemetry_service.backfill_message())
+            else:
+                await websocket.send_json(
+                    {
+                        "type": "hello",
+                        "format": message_format,
+                        "channels": sorted(subscription.channels),
+                        "devices": {telemetry_service.channel: 0},
+                    }
+                )
+                self._queue_backfill(subscription, subscription.channels)
 
-                await websocket.send_json(status_data)
-                await asyncio.sleep(1)
+            while True:
+                getter = asyncio.create_task(subscription.queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, receiver}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if receiver in done:
+                    getter.cancel()
+                    receiver.result()
+                channel, message = getter.result()
+                WEBSOCKET_QUEUE_DEPTH.set(subscription.queue.qsize(), client=client)
+                await self._send(websocket, message_format, channel, message)
         except WebSocketDisconnect:
             print("Client disconnected normally")
             raise
@@ -151,6 +452,9 @@ class ConnectionManager:
             print(f"Error sending message: {e}")
             raise
         finally:
+            receiver.cancel()
+            WEBSOCKET_QUEUE_DEPTH.remove(client=client)
+            telemetry_service.unsubscribe(subscription)
             self.disconnect(websocket)
 
 
@@ -158,10 +462,32 @@ manager = ConnectionManager()
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket, format: str = "json", channels: str | None = None
+):
+    message_format = "binary" if format == "binary" else "json"
+    requested_channels = None
+    if channels is not None:
+        requested_channels = {name for name in channels.split(",") if name}
+        unknown = requested_channels - set(telemetry_service.channels)
+        # Only a missing parameter means the legacy status stream; an empty or
+        # misspelt list is refused rather than quietly falling back to it
+        if not requested_channels or unknown:
+            await websocket.close(
+                code=status.WS_1008_POLICY_VIOLATION,
+                reason=(
+                    f"Unknown channels: {', '.join(sorted(unknown))}"
+                    if unknown
+                    else "No channels requested"
+                ),
+            )
+            return
+    elif message_format == "binary":
+        requested_channels = set(telemetry_service.channels)
+
     try:
         await manager.connect(websocket)
-        await manager.send_message(websocket)
+        await manager.send_message(websocket, message_format, requested_channels)
     except WebSocketDisconnect:
         print("WebSocket disconnected")
     except Exception as e:
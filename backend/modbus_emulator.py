@@ -0,0 +1,201 @@
+import argparse
+import os
+import pty
+import random
+import select
+import sys
+import threading
+import time
+import tty
+
+from serial_device import crc16
+from thermal_plant import ThermalPlant
+
+PV_REGISTER = 0x2000
+OUTPUT_REGISTER = 0x2001
+SV_REGISTER = 0x2002
+SETPOINT_REGISTER = 0x2103
+
+READ_HOLDING_REGISTERS = 0x03
+WRITE_SINGLE_REGISTER = 0x06
+REQUEST_LENGTH = 8
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+
+
+class ModbusSlaveEmulator:
+    def __init__(
+        self,
+        device_id: int = 1,
+        plant: ThermalPlant | None = None,
+        latency: float = 0.0,
+        drop_rate: float = 0.0,
+        corrupt_rate: float = 0.0,
+        seed: int | None = None,
+    ):
+        self.device_id = device_id
+        self.plant = plant or ThermalPlant()
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self._random = random.Random(seed)
+        self._master_fd: int | None = None
+        self._slave_fd: int | None = None
+        self._port: str | None = None
+        self._last_advance = time.monotonic()
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+    @property
+    def port(self) -> str | None:
+        return self._port
+
+    def open(self) -> str:
+        self._master_fd, self._slave_fd = pty.openpty()
+        tty.setraw(self._slave_fd)
+        # Keeping the slave end open stops reads on the master failing with
+        # EIO between client connections
+        self._port = os.ttyname(self._slave_fd)
+        return self._port
+
+    def close(self) -> None:
+        for fd in (self._master_fd, self._slave_fd):
+            if fd is not None:
+                os.close(fd)
+        self._master_fd = self._slave_fd = None
+
+    def start(self) -> str:
+        port = self._port or self.open()
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="modbus-emulator", daemon=True
+        )
+        self._thread.start()
+        return port
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.close()
+
+    def _registers(self) -> dict[int, int]:
+        now = time.monotonic()
+        self.plant.advance(now - self._last_advance)
+        self._last_advance = now
+        setpoint = max(0, round(self.plant.setpoint * 10)) & 0xFFFF
+        return {
+            PV_REGISTER: max(0, round(self.plant.temperature * 10)) & 0xFFFF,
+            OUTPUT_REGISTER: 0,
+            SV_REGISTER: setpoint,
+            SETPOINT_REGISTER: setpoint,
+        }
+
+    def _exception(self, function_code: int, code: int) -> bytes:
+        frame = bytes([self.device_id, function_code | 0x80, code])
+        return frame + crc16(frame)
+
+    def handle_frame(self, frame: bytes) -> bytes | None:
+        if frame[0] != self.device_id:
+            return None
+
+        function_code = frame[1]
+        address = int.from_bytes(frame[2:4], "big")
+        value = int.from_bytes(frame[4:6], "big")
+        registers = self._registers()
+
+        if function_code == READ_HOLDING_REGISTERS:
+            addresses = range(address, address + value)
+            if not value or any(a not in registers for a in addresses):
+                return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+            data = b"".join(registers[a].to_bytes(2, "big") for a in addresses)
+            response = bytes([self.device_id, function_code, len(data)]) + data
+            return response + crc16(response)
+
+        if function_code == WRITE_SINGLE_REGISTER:
+            if address != SETPOINT_REGISTER:
+                return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+            self.plant.setpoint = value / 10
+            return bytes(frame)
+
+        return self._exception(function_code, ILLEGAL_FUNCTION)
+
+    def _respond(self, frame: bytes) -> None:
+        response = self.handle_frame(frame)
+        if response is None or self._random.random() < self.drop_rate:
+            return
+        if self._random.random() < self.corrupt_rate:
+            corrupted = bytearray(response)
+            corrupted[self._random.randrange(len(corrupted))] ^= 0xFF
+            response = bytes(corrupted)
+        if self.latency:
+            time.sleep(self.latency)
+        os.write(self._master_fd, response)
+
+    def serve_forever(self) -> None:
+        buffer = bytearray()
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([self._master_fd], [], [], 0.1)
+            if not readable:
+                # A silent line marks the end of any partial frame
+                buffer.clear()
+                continue
+            buffer += os.read(self._master_fd, 256)
+            while len(buffer) >= REQUEST_LENGTH:
+                frame = bytes(buffer[:REQUEST_LENGTH])
+                if crc16(frame[:-2]) != frame[-2:]:
+                    # Resynchronise one byte at a time; real slaves stay silent
+                    del buffer[0]
+                    continue
+                del buffer[:REQUEST_LENGTH]
+                self._respond(frame)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Emulate a Modbus RTU temperature controller on a pty"
+    )
+    parser.add_argument("--device-id", type=int, default=1)
+    parser.add_argument("--temperature", type=float, default=20.0)
+    parser.add_argument("--time-constant", type=float, default=30.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--link", help="also expose the pty under this path")
+    args = parser.parse_args()
+
+    emulator = ModbusSlaveEmulator(
+        device_id=args.device_id,
+        plant=ThermalPlant(
+            temperature=args.temperature, time_constant=args.time_constant
+        ),
+        latency=args.latency,
+        drop_rate=args.drop_rate,
+        corrupt_rate=args.corrupt_rate,
+        seed=args.seed,
+    )
+    port = emulator.open()
+    if args.link:
+        if os.path.islink(args.link):
+            os.remove(args.link)
+        os.symlink(port, args.link)
+        port = args.link
+    print(f"Modbus RTU emulator listening on {port}", flush=True)
+    print(f"Start the backend with SERIAL_PORT={port}", flush=True)
+
+    try:
+        emulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        emulator.close()
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from decimal import Decimal
 import uuid
 from enum import Enum
@@ -89,10 +89,77 @@ class ProcedureStatus(Enum):
     STOPPED = "stopped"
 
 
+SETPOINT_TOLERANCE = 1.0
+
+
+@dataclass
+class StepStatistics:
+    tolerance: float = SETPOINT_TOLERANCE
+    samples: int = 0
+    initial_temperature: float | None = None
+    sum_abs_error: float = 0.0
+    sum_squared_error: float = 0.0
+    max_error: float = 0.0
+    overshoot: float = 0.0
+    time_to_setpoint: int | None = None
+    # Elapsed time of the first in-band sample since the last out-of-band one
+    settled_at: int | None = None
+
+    def update(self, setpoint: float, actual: float, elapsed: int) -> None:
+        if self.initial_temperature is None:
+            self.initial_temperature = actual
+        error = actual - setpoint
+        abs_error = abs(error)
+        self.samples += 1
+        self.sum_abs_error += abs_error
+        self.sum_squared_error += error * error
+        self.max_error = max(self.max_error, abs_error)
+        # Overshoot is measured past the setpoint in the direction of travel
+        direction = 1 if setpoint >= self.initial_temperature else -1
+        self.overshoot = max(self.overshoot, direction * error)
+        if abs_error <= self.tolerance:
+            if self.time_to_setpoint is None:
+                self.time_to_setpoint = elapsed
+            if self.settled_at is None:
+                self.settled_at = elapsed
+        else:
+            self.settled_at = None
+
+    @property
+    def mean_error(self) -> float | None:
+        if not self.samples:
+            return None
+        return self.sum_abs_error / self.samples
+
+    @property
+    def rms_error(self) -> float | None:
+        if not self.samples:
+            return None
+        return (self.sum_squared_error / self.samples) ** 0.5
+
+    @property
+    def settling_time(self) -> int | None:
+        # Samples may be skipped, so this is the elapsed time of a sample
+        # rather than one past the last out-of-band second
+        return self.settled_at
+
+    def to_dict(self) -> dict[str, float | int | None]:
+        return {
+            "samples": self.samples,
+            "mean_error": self.mean_error,
+            "max_error": self.max_error if self.samples else None,
+            "rms_error": self.rms_error,
+            "overshoot": self.overshoot if self.samples else None,
+            "time_to_setpoint": self.time_to_setpoint,
+            "settling_time": self.settling_time,
+        }
+
+
 @dataclass
 class RuntimeStepState:
     status: StepStatus = StepStatus.QUEUED
     elapsed_time: int = 0
+    statistics: StepStatistics = field(default_factory=StepStatistics)
 
 
 class RuntimeProcedureState:
@@ -107,7 +174,11 @@ class RuntimeProcedureState:
         for step, state in zip(self.procedure.steps, self.step_states):
             step_dict = dict(step)
             step_dict.update(
-                {"status": state.status.value, "elapsed_time": state.elapsed_time}
+                {
+                    "status": state.status.value,
+                    "elapsed_time": state.elapsed_time,
+                    "statistics": state.statistics.to_dict(),
+                }
             )
             steps.append(step_dict)
 
@@ -119,6 +190,12 @@ class RuntimeProcedureState:
             "current_step": self.current_step,
         }
 
+    def statistics(self) -> list[dict[str, float | int | None]]:
+        return [
+            {"step": i, **state.statistics.to_dict()}
+            for i, state in enumerate(self.step_states)
+        ]
+
 
 class Procedure:
     id: str
@@ -0,0 +1,279 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Callable
+
+from device_owner import STREAM_LIMIT, encode_line
+from model import Procedure, ProcedureStep, Temperature
+from serial_device import DeviceUnavailableError, SerialDevice
+from telemetry import TelemetryHub
+from temperature_rollup import RollupRecord
+
+REMOTE_ERRORS: dict[str, type[Exception]] = {
+    "DeviceUnavailableError": DeviceUnavailableError,
+    "ConnectionError": ConnectionError,
+    "OSError": IOError,
+    "ValueError": ValueError,
+}
+
+
+class DeviceOwnerClient:
+    def __init__(self, socket_path: str, retry_interval: float = 1.0):
+        self._socket_path = socket_path
+        self._retry_interval = retry_interval
+        self._writer: asyncio.StreamWriter | None = None
+        self._pending: dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._listeners: list[Callable[[dict], None]] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    def listen(self, callback: Callable[[dict], None]) -> None:
+        self._listeners.append(callback)
+
+    def start(self) -> None:
+        if not self._task:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def call(self, method: str, **params: Any) -> Any:
+        if not self._writer:
+            raise ConnectionError("Device owner is not reachable")
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(
+                encode_line({"id": request_id, "method": method, "params": params})
+            )
+            reply = await future
+        finally:
+            self._pending.pop(request_id, None)
+
+        if "error" in reply:
+            error = reply["error"]
+            for name in [error["type"], *error.get("bases", [])]:
+                if name in REMOTE_ERRORS:
+                    raise REMOTE_ERRORS[name](error["message"])
+            raise RuntimeError(error["message"])
+        return reply["result"]
+
+    def call_sync(self, method: str, timeout: float = 30, **params: Any) -> Any:
+        # For synchronous endpoints, which FastAPI runs off the event loop
+        return asyncio.run_coroutine_threadsafe(
+            self.call(method, **params), self._loop
+        ).result(timeout)
+
+    def _dispatch(self, message: dict) -> None:
+        if "event" in message:
+            for listener in self._listeners:
+                listener(message)
+            return
+        future = self._pending.get(message.get("id"))
+        if future and not future.done():
+            future.set_result(message)
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        while line := await reader.readline():
+            self._dispatch(json.loads(line))
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    self._socket_path, limit=STREAM_LIMIT
+                )
+            except OSError:
+                await asyncio.sleep(self._retry_interval)
+                continue
+
+            self._writer = writer
+            reader_task = asyncio.create_task(self._read(reader))
+            try:
+                snapshot = await self.call("subscribe")
+                self._dispatch({"event": "snapshot", **snapshot})
+                await reader_task
+            except (ConnectionError, ValueError) as e:
+                print(f"Lost connection to device owner: {e}")
+            finally:
+                reader_task.cancel()
+                self._writer = None
+                writer.close()
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(
+                            ConnectionError("Device owner connection lost")
+                        )
+            await asyncio.sleep(self._retry_interval)
+
+
+class RemoteSerialDevice(SerialDevice):
+    def __init__(self, owner: DeviceOwnerClient):
+        self._owner = owner
+        self._port: str | None = None
+        owner.listen(self._handle_event)
+
+    def _handle_event(self, event: dict) -> None:
+        if event["event"] in ("snapshot", "port"):
+            self._port = event["port"]
+
+    @property
+    def port(self) -> str | None:
+        return self._port
+
+    async def connect(self, port: str | None = None) -> None:
+        await self._owner.call("connect", port=port)
+
+    async def disconnect(self) -> None:
+        await self._owner.call("disconnect")
+
+    async def change_port(self, port: str) -> None:
+        await self._owner.call("change_port", port=port)
+
+    async def read_temperature(self) -> Temperature:
+        return Temperature(await self._owner.call("read_temperature"))
+
+    async def set_temperature(self, temperature: Temperature) -> None:
+        await self._owner.call("set_temperature", temperature=temperature.float_celsius)
+
+    async def is_connected(self) -> bool:
+        return self._owner.connected and await self._owner.call("is_connected")
+
+    async def status(self) -> dict[str, float | str]:
+        return await self._owner.call("status")
+
+
+class RemoteProcedureState:
+    # Read-only view of the owner's RuntimeProcedureState, rebuilt from to_dict()
+    def __init__(self, data: dict):
+        self._data = data
+        self.procedure = Procedure(
+            data["name"],
+            [
+                ProcedureStep(Temperature(step["temperature"]), step["duration"])
+                for step in data["steps"]
+            ],
+            data["id"],
+        )
+
+    def to_dict(self) -> dict:
+        return self._data
+
+    def __iter__(self):
+        # Serialized as the owner's to_dict() view when returned by an endpoint
+        return iter(self._data.items())
+
+
+class RemoteExecutionService:
+    def __init__(self, owner: DeviceOwnerClient):
+        self._owner = owner
+        self._active_procedure: RemoteProcedureState | None = None
+        self._state_version = 0
+        self._state_changed = asyncio.Event()
+        owner.listen(self._handle_event)
+
+    def _handle_event(self, event: dict) -> None:
+        if event["event"] not in ("snapshot", "state"):
+            return
+        procedure = event["procedure"]
+        self._active_procedure = RemoteProcedureState(procedure) if procedure else None
+        self._state_version = event["version"]
+        self._state_changed.set()
+        self._state_changed = asyncio.Event()
+
+    def get_active_procedure(self) -> RemoteProcedureState | None:
+        return self._active_procedure
+
+    def get_state_version(self) -> int:
+        return self._state_version
+
+    async def wait_for_state_change(
+        self, since_version: int, timeout: float | None = None
+    ) -> int:
+        if self._state_version == since_version:
+            try:
+                await asyncio.wait_for(self._state_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._state_version
+
+    async def start_procedure(self, procedure_id: str) -> dict:
+        return await self._owner.call("start_procedure", procedure_id=procedure_id)
+
+    async def stop_procedure(self) -> dict:
+        return await self._owner.call("stop_procedure")
+
+    async def get_interrupted_run(self) -> dict | None:
+        return await self._owner.call("get_interrupted_run")
+
+    async def resume_procedure(self) -> dict:
+        return await self._owner.call("resume_procedure")
+
+    async def discard_interrupted_run(self) -> None:
+        await self._owner.call("discard_interrupted_run")
+
+    async def reset_active_procedure(self) -> None:
+        # The owner's state event confirms the reset; clear the local view now
+        # so the caller's response already reflects it
+        self._active_procedure = None
+        await self._owner.call("reset_active_procedure")
+
+
+class RemoteTemperatureLogger:
+    def __init__(self, owner: DeviceOwnerClient):
+        self._owner = owner
+
+    def query_history(
+        self, start: datetime, end: datetime, resolution: int
+    ) -> tuple[int, list[RollupRecord]]:
+        result = self._owner.call_sync(
+            "query_history",
+            start=start.isoformat(),
+            end=end.isoformat(),
+            resolution=resolution,
+        )
+        return result["resolution"], result["records"]
+
+
+class RemoteTelemetryService(TelemetryHub):
+    def __init__(self, owner: DeviceOwnerClient, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._owner = owner
+        owner.listen(self._handle_event)
+
+    def _handle_event(self, event: dict) -> None:
+        if event["event"] == "snapshot":
+            backfill = event["backfill"]
+            self._interval = backfill["interval"]
+            self._history.clear()
+            for sample in zip(
+                backfill["timestamps"], backfill["setpoint"], backfill["actual"]
+            ):
+                self._history.append(*sample)
+        elif event["event"] == "telemetry":
+            message = event["data"]
+            if event["channel"] == self.channel and message["status"] == "OK":
+                self._history.append(
+                    message["timestamp"], message["setpoint"], message["actual"]
+                )
+            self._publish(event["channel"], message)
+
+    def start(self) -> None:
+        self._owner.start()
+
+    async def stop(self) -> None:
+        await self._owner.stop()
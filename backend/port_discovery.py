@@ -0,0 +1,45 @@
+import asyncio
+from serial.tools import list_ports
+
+
+class SerialPortWatcher:
+    def __init__(self, interval: float = 2.0):
+        self._interval = interval
+        self._ports: list[str] = []
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ports(self) -> list[str]:
+        return list(self._ports)
+
+    def _scan(self) -> list[str]:
+        return sorted(port.device for port in list_ports.comports())
+
+    async def refresh(self) -> list[str]:
+        # Enumeration can block for a noticeable time on Windows
+        ports = await asyncio.to_thread(self._scan)
+        if ports != self._ports:
+            print(f"Serial ports changed: {ports}")
+            self._ports = ports
+        return self.ports
+
+    def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Error scanning serial ports: {e}")
+            await asyncio.sleep(self._interval)
@@ -1,8 +1,21 @@
+import asyncio
+import base64
+import itertools
 import json
 import os
 from abc import ABC, abstractmethod
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, TypeVar
 from model import Procedure, ProcedureStep, Temperature
 
+try:
+    import fcntl
+except ImportError:
+    # Windows: a single API process owns the file, so no cross-process lock
+    fcntl = None
+
 
 class IProcedureRepository(ABC):
     @abstractmethod
@@ -25,27 +38,130 @@ class IProcedureRepository(ABC):
     def update(self, procedure: Procedure) -> bool:
         pass
 
+    def upsert_many(self, procedures: list[Procedure]) -> None:
+        for procedure in procedures:
+            if not self.update(procedure):
+                self.add(procedure)
+
+    def list_page(
+        self, cursor: str | None = None, limit: int = 50, name: str | None = None
+    ) -> tuple[list[Procedure], str | None]:
+        return paginate(self.load_all(), lambda p: (p.name, p.id), cursor, limit, name)
+
+
+T = TypeVar("T")
+
+
+def paginate(
+    items: list[T],
+    key: Callable[[T], tuple[str, str]],
+    cursor: str | None,
+    limit: int,
+    name: str | None,
+    presorted: bool = False,
+) -> tuple[list[T], str | None]:
+    # Ordered by (name, id) so a cursor stays valid when procedures are
+    # added or deleted between pages. Callers paging through a large list
+    # repeatedly pass it presorted, so a page costs O(log n + limit).
+    if not presorted:
+        items = sorted(items, key=key)
+    start = bisect_right(items, decode_cursor(cursor), key=key) if cursor else 0
+    page: list[T] = []
+    has_more = False
+    for item in itertools.islice(items, start, None):
+        if name and name.lower() not in key(item)[0].lower():
+            continue
+        if len(page) == limit:
+            has_more = True
+            break
+        page.append(item)
+    next_cursor = encode_cursor(*key(page[-1])) if page and has_more else None
+    return page, next_cursor
+
+
+def encode_cursor(name: str, procedure_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([name, procedure_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        name, procedure_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(name), str(procedure_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _procedure_dict_key(procedure: dict) -> tuple[str, str]:
+    return procedure["name"], procedure["id"]
+
 
 class JsonProcedureRepository(IProcedureRepository):
     def __init__(self, file_path: str = "data/procedures.json"):
         self.file_path = file_path
+        # Parsed file contents, reused until another write changes the file
+        self._cache: tuple[tuple[int, int, int], list[dict]] | None = None
+        # The same contents ordered for paging, so paging through the
+        # library sorts it once rather than once per page
+        self._sorted_cache: tuple[tuple[int, int, int], list[dict]] | None = None
         self._ensure_data_directory()
 
     def _ensure_data_directory(self) -> None:
         os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
 
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        # Serializes read-modify-write cycles across API worker processes;
+        # the atomic replace alone would still lose concurrent updates
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.file_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     def _save_procedures(self, procedures: list[dict]) -> None:
-        with open(self.file_path, "w") as f:
+        # Replace the file atomically so a reader in another API worker never
+        # sees a half-written library
+        temp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
             json.dump(procedures, f, indent=2)
+        os.replace(temp_path, self.file_path)
+        self._cache = (self._file_signature(), list(procedures))
+
+    def _file_signature(self) -> tuple[int, int, int]:
+        # Every save replaces the file, so the inode changes even when another
+        # worker rewrites it within the timestamp granularity at the same size
+        stat = os.stat(self.file_path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
 
     def _load_procedures(self) -> list[dict]:
         if not os.path.exists(self.file_path):
+            self._cache = None
             return []
+        signature = self._file_signature()
+        if self._cache and self._cache[0] == signature:
+            return list(self._cache[1])
         try:
             with open(self.file_path, "r") as f:
-                return json.load(f)
+                procedures = json.load(f)
         except json.JSONDecodeError:
+            self._cache = None
             return []
+        self._cache = (signature, procedures)
+        return list(procedures)
+
+    def _load_sorted_procedures(self) -> list[dict]:
+        procedures = self._load_procedures()
+        signature = self._cache[0] if self._cache else None
+        if signature and self._sorted_cache and self._sorted_cache[0] == signature:
+            return self._sorted_cache[1]
+        procedures.sort(key=_procedure_dict_key)
+        if signature:
+            self._sorted_cache = (signature, procedures)
+        return procedures
 
     def _dict_to_procedure(self, proc_dict: dict) -> Procedure:
         steps = [
@@ -58,31 +174,164 @@ class JsonProcedureRepository(IProcedureRepository):
 
     def save_all(self, procedures: list[Procedure]) -> None:
         procedures_dict = [dict(proc) for proc in procedures]
-        self._save_procedures(procedures_dict)
+        with self._locked():
+            self._save_procedures(procedures_dict)
 
     def load_all(self) -> list[Procedure]:
         procedures_dict = self._load_procedures()
         return [self._dict_to_procedure(proc) for proc in procedures_dict]
 
     def add(self, procedure: Procedure) -> None:
-        procedures = self._load_procedures()
-        procedures.append(dict(procedure))
-        self._save_procedures(procedures)
-
-    def delete(self, procedure_id: str) -> bool:
-        procedures = self._load_procedures()
-        initial_length = len(procedures)
-        procedures = [p for p in procedures if p["id"] != procedure_id]
-        if len(procedures) < initial_length:
+        with self._locked():
+            procedures = self._load_procedures()
+            procedures.append(dict(procedure))
             self._save_procedures(procedures)
-            return True
-        return False
 
-    def update(self, procedure: Procedure) -> bool:
-        procedures = self._load_procedures()
-        for i, proc in enumerate(procedures):
-            if proc["id"] == procedure.id:
-                procedures[i] = dict(procedure)
+    def delete(self, procedure_id: str) -> bool:
+        with self._locked():
+            procedures = self._load_procedures()
+            initial_length = len(procedures)
+            procedures = [p for p in procedures if p["id"] != procedure_id]
+            if len(procedures) < initial_length:
                 self._save_procedures(procedures)
                 return True
-        return False
+            return False
+
+    def update(self, procedure: Procedure) -> bool:
+        with self._locked():
+            procedures = self._load_procedures()
+            for i, proc in enumerate(procedures):
+                if proc["id"] == procedure.id:
+                    procedures[i] = dict(procedure)
+                    self._save_procedures(procedures)
+                    return True
+            return False
+
+    def list_page(
+        self, cursor: str | None = None, limit: int = 50, name: str | None = None
+    ) -> tuple[list[Procedure], str | None]:
+        # Pages the stored dicts so only the returned page is converted
+        page, next_cursor = paginate(
+            self._load_sorted_procedures(),
+            _procedure_dict_key,
+            cursor,
+            limit,
+            name,
+            presorted=True,
+        )
+        return [self._dict_to_procedure(p) for p in page], next_cursor
+
+    def upsert_many(self, procedures: list[Procedure]) -> None:
+        # One read and one write for the whole batch
+        with self._locked():
+            stored = self._load_procedures()
+            index = {proc["id"]: i for i, proc in enumerate(stored)}
+            for procedure in procedures:
+                if procedure.id in index:
+                    stored[index[procedure.id]] = dict(procedure)
+                else:
+                    index[procedure.id] = len(stored)
+                    stored.append(dict(procedure))
+            self._save_procedures(stored)
+
+
+class InMemoryProcedureRepository(IProcedureRepository):
+    def __init__(self, procedures: list[Procedure] | None = None):
+        self._procedures: dict[str, Procedure] = {p.id: p for p in procedures or []}
+
+    def save_all(self, procedures: list[Procedure]) -> None:
+        self._procedures = {p.id: p for p in procedures}
+
+    def load_all(self) -> list[Procedure]:
+        return list(self._procedures.values())
+
+    def add(self, procedure: Procedure) -> None:
+        self._procedures[procedure.id] = procedure
+
+    def delete(self, procedure_id: str) -> bool:
+        return self._procedures.pop(procedure_id, None) is not None
+
+    def update(self, procedure: Procedure) -> bool:
+        if procedure.id not in self._procedures:
+            return False
+        self._procedures[procedure.id] = procedure
+        return True
+
+
+class IAsyncProcedureRepository(ABC):
+    @abstractmethod
+    async def save_all(self, procedures: list[Procedure]) -> None:
+        pass
+
+    @abstractmethod
+    async def load_all(self) -> list[Procedure]:
+        pass
+
+    @abstractmethod
+    async def add(self, procedure: Procedure) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, procedure_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def update(self, procedure: Procedure) -> bool:
+        pass
+
+    @abstractmethod
+    async def upsert_many(self, procedures: list[Procedure]) -> None:
+        pass
+
+    @abstractmethod
+    async def list_page(
+        self, cursor: str | None = None, limit: int = 50, name: str | None = None
+    ) -> tuple[list[Procedure], str | None]:
+        pass
+
+
+class ThreadedProcedureRepository(IAsyncProcedureRepository):
+    # Runs a blocking repository on a worker thread so file and parsing work
+    # stays off the event loop. A single thread also serializes the
+    # read-modify-write cycles of concurrent requests.
+    def __init__(
+        self,
+        repository: IProcedureRepository,
+        executor: ThreadPoolExecutor | None = None,
+    ):
+        self._repository = repository
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="procedure-repository"
+        )
+
+    @property
+    def repository(self) -> IProcedureRepository:
+        return self._repository
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    async def save_all(self, procedures: list[Procedure]) -> None:
+        await self._run(self._repository.save_all, procedures)
+
+    async def load_all(self) -> list[Procedure]:
+        return await self._run(self._repository.load_all)
+
+    async def add(self, procedure: Procedure) -> None:
+        await self._run(self._repository.add, procedure)
+
+    async def delete(self, procedure_id: str) -> bool:
+        return await self._run(self._repository.delete, procedure_id)
+
+    async def update(self, procedure: Procedure) -> bool:
+        return await self._run(self._repository.update, procedure)
+
+    async def upsert_many(self, procedures: list[Procedure]) -> None:
+        await self._run(self._repository.upsert_many, procedures)
+
+    async def list_page(
+        self, cursor: str | None = None, limit: int = 50, name: str | None = None
+    ) -> tuple[list[Procedure], str | None]:
+        return await self._run(self._repository.list_page, cursor, limit, name)
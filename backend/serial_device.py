@@ -5,11 +5,95 @@ from typing import Callable, TypeVar, ParamSpec
 from decimal import Decimal
 from model import Temperature
 from functools import wraps
+import math
 import time
+from clock import Clock
+from metrics import (
+    MODBUS_CIRCUIT_OPEN,
+    MODBUS_ERRORS_TOTAL,
+    MODBUS_ROUND_TRIP_SECONDS,
+)
+from serial_trace import RecordingTransport, ReplayTransport, SerialTraceWriter
+from thermal_plant import ThermalPlant
 
 P = ParamSpec("P")
 T = TypeVar("T")
 
+# 8 data bits, no parity, 2 stop bits plus the start bit
+BITS_PER_CHARACTER = 11
+# Slave processing time and OS scheduling on top of the bytes on the wire
+RESPONSE_MARGIN = 0.01
+MAX_RESPONSE_TIMEOUT = 1.0
+# Timeouts are rounded up to this step so a settled estimate keeps the same
+# value and the port does not have to be reconfigured for every request
+TIMEOUT_RESOLUTION = 0.005
+
+
+class DeviceUnavailableError(IOError):
+    pass
+
+
+class AdaptiveTimeout:
+    # Jacobson/Karels round-trip estimator, as used for TCP retransmissions
+    def __init__(self, ceiling: float = MAX_RESPONSE_TIMEOUT):
+        self._ceiling = ceiling
+        self._smoothed: float | None = None
+        self._variation = 0.0
+
+    @property
+    def calibrated(self) -> bool:
+        return self._smoothed is not None
+
+    def timeout(self, floor: float) -> float:
+        if self._smoothed is None:
+            return self._ceiling
+        timeout = max(floor, self._smoothed + 4 * self._variation)
+        return min(
+            self._ceiling, math.ceil(timeout / TIMEOUT_RESOLUTION) * TIMEOUT_RESOLUTION
+        )
+
+    def observe(self, round_trip: float) -> None:
+        if self._smoothed is None:
+            self._smoothed = round_trip
+            self._variation = round_trip / 2
+        else:
+            self._variation = 0.75 * self._variation + 0.25 * abs(
+                self._smoothed - round_trip
+            )
+            self._smoothed = 0.875 * self._smoothed + 0.125 * round_trip
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 5.0):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        # Once the reset timeout has passed, requests go through again as
+        # trials; the first success closes the circuit
+        return (
+            self._opened_at is None
+            or time.monotonic() - self._opened_at >= self._reset_timeout
+        )
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self._opened_at is not None:
+            self._opened_at = None
+            MODBUS_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self._failure_threshold:
+            self._opened_at = time.monotonic()
+            MODBUS_CIRCUIT_OPEN.set(1)
+
 
 def crc16(data: bytes) -> bytes:
     crc = 0xFFFF
@@ -36,13 +120,22 @@ def require_connection(func: Callable[P, T]) -> Callable[P, T]:
 
 class SerialDevice(ABC):
     @abstractmethod
-    async def connect(self, port: str) -> None:
+    async def connect(self, port: str | None = None) -> None:
         pass
 
     @abstractmethod
     async def disconnect(self) -> None:
         pass
 
+    @abstractmethod
+    async def change_port(self, port: str) -> None:
+        pass
+
+    @property
+    @abstractmethod
+    def port(self) -> str | None:
+        pass
+
     @abstractmethod
     async def read_temperature(self) -> Temperature:
         pass
@@ -61,59 +154,185 @@ class SerialDevice(ABC):
 
 
 class RealSerialDevice(SerialDevice):
-    def __init__(self, port: str, device_id: int = 1):
+    def __init__(
+        self,
+        port: str,
+        device_id: int = 1,
+        trace_path: str | None = None,
+        baudrate: int = 9600,
+        max_retries: int = 2,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+    ):
         self._serial: serial.Serial | None = None
         self._port = port
         self._device_id = device_id
+        self._baudrate = baudrate
+        self._character_time = BITS_PER_CHARACTER / baudrate
+        self._max_retries = max_retries
+        self._response_timeout = AdaptiveTimeout()
+        self._breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # One trace spans every reconnect and port change of this device
+        self._trace = SerialTraceWriter(trace_path) if trace_path else None
         self._target_temp: Temperature = Temperature(value=Decimal("0"))
         self._current_temp: Temperature = Temperature(value=Decimal("0"))
         self._lock = False
         self._last_update_time = time.time()
 
-    async def connect(self) -> None:
-        try:
-            while self._lock:
-                await asyncio.sleep(0.01)
-            self._lock = True
+    @property
+    def port(self) -> str | None:
+        return self._port
 
+    def _open(self) -> None:
+        try:
             self._serial = serial.Serial(
                 port=self._port,
-                baudrate=9600,
+                baudrate=self._baudrate,
                 parity=serial.PARITY_NONE,
                 stopbits=serial.STOPBITS_TWO,
                 bytesize=serial.EIGHTBITS,
-                timeout=1,
+                timeout=MAX_RESPONSE_TIMEOUT,
             )
-            self._lock = False
         except serial.SerialException as e:
-            self._lock = False
+            self._serial = None
             raise ConnectionError(
                 f"Failed to connect to device on port {self._port}: {str(e)}"
             )
+        if self._trace:
+            self._serial = RecordingTransport(self._serial, self._trace)
+        # A new link starts with fresh round-trip and failure history
+        self._response_timeout = AdaptiveTimeout()
+        self._breaker.record_success()
 
-    async def disconnect(self) -> None:
+    def _close(self) -> None:
+        if self._serial and self._serial.is_open:
+            self._serial.close()
+        self._serial = None
+
+    async def connect(self, port: str | None = None) -> None:
         while self._lock:
             await asyncio.sleep(0.01)
         self._lock = True
 
-        if self._serial and self._serial.is_open:
-            self._serial.close()
+        try:
+            if port:
+                self._port = port
+            self._open()
+        finally:
+            self._lock = False
 
+    async def disconnect(self) -> None:
+        while self._lock:
+            await asyncio.sleep(0.01)
+        self._lock = True
+
+        self._close()
         self._lock = False
-        self._serial = None
+
+    async def change_port(self, port: str) -> None:
+        # Waiting for the lock drains the in-flight command before the switch
+        while self._lock:
+            await asyncio.sleep(0.01)
+        self._lock = True
+
+        previous_port = self._port
+        try:
+            self._close()
+            self._port = port
+            self._open()
+        except ConnectionError:
+            self._port = previous_port
+            try:
+                self._open()
+            except ConnectionError:
+                pass
+            raise
+        finally:
+            self._lock = False
+
+    def _transact(self, message: bytearray, response_length: int) -> bytes:
+        function_code = f"0x{message[1]:02x}"
+        if not self._breaker.allow():
+            raise DeviceUnavailableError(
+                f"Device on port {self._port} is not responding"
+            )
+        try:
+            return self._exchange(message, response_length, function_code)
+        except serial.SerialException as e:
+            # The port itself failed, e.g. an unplugged USB adapter; unlike a
+            # lost frame this does not clear up by the next sample
+            self._breaker.record_failure()
+            MODBUS_ERRORS_TOTAL.inc(function_code=function_code, kind="port")
+            # Closing makes is_connected() false, so the telemetry loop's
+            # reconnect reopens the port once the adapter is back
+            try:
+                self._close()
+            except (OSError, serial.SerialException):
+                self._serial = None
+            raise ConnectionError(
+                f"Lost connection to device on port {self._port}: {str(e)}"
+            )
+
+    def _exchange(
+        self, message: bytearray, response_length: int, function_code: str
+    ) -> bytes:
+        # Never wait less than the frames take on the wire plus the 3.5
+        # character inter-frame gap
+        floor = (
+            len(message) + response_length + 3.5
+        ) * self._character_time + RESPONSE_MARGIN
+        timeout = self._response_timeout.timeout(floor)
+        # Until a round trip has been measured the timeout sits at the
+        # ceiling, so a retry would only stretch a dead device's silence
+        attempts = self._max_retries + 1 if self._response_timeout.calibrated else 1
+        # All attempts together never take longer than one uncalibrated wait
+        deadline = time.perf_counter() + MAX_RESPONSE_TIMEOUT
+        for attempt in range(attempts):
+            remaining = deadline - time.perf_counter()
+            if attempt and remaining < floor:
+                break
+            attempt_timeout = min(timeout, remaining) if attempt else timeout
+            # pyserial reconfigures an open port on every assignment
+            if self._serial.timeout != attempt_timeout:
+                self._serial.timeout = attempt_timeout
+            started = time.perf_counter()
+            self._serial.write(message)
+            response = self._serial.read(response_length)
+            round_trip = time.perf_counter() - started
+            MODBUS_ROUND_TRIP_SECONDS.observe(round_trip, function_code=function_code)
+
+            if len(response) != response_length:
+                kind, error = "timeout", "Invalid response length"
+                timeout = min(timeout * 2, MAX_RESPONSE_TIMEOUT)
+            elif crc16(response[:-2]) != response[-2:]:
+                kind, error = "crc", "Invalid response CRC"
+            else:
+                # Retried exchanges are ambiguous samples (Karn's algorithm)
+                if attempt == 0:
+                    self._response_timeout.observe(round_trip)
+                self._breaker.record_success()
+                return response
+
+            MODBUS_ERRORS_TOTAL.inc(function_code=function_code, kind=kind)
+            # Drop late or garbled bytes so they are not taken as the next
+            # response, then leave the line idle for an inter-frame gap
+            self._serial.reset_input_buffer()
+            time.sleep(3.5 * self._character_time)
+
+        self._breaker.record_failure()
+        raise IOError(error)
 
     def _has_one_second_passed(self) -> bool:
         return time.time() - self._last_update_time >= 1
 
     @require_connection
     async def read_temperature(self) -> Temperature:
-        try:
-            while self._lock:
-                await asyncio.sleep(0.01)
-            self._lock = True
+        while self._lock:
+            await asyncio.sleep(0.01)
+        self._lock = True
 
+        try:
             if not self._has_one_second_passed():
-                self._lock = False
                 return self._current_temp
 
             # Modbus RTU read holding registers command
@@ -131,12 +350,8 @@ class RealSerialDevice(SerialDevice):
             )
             message += crc16(message)
 
-            self._serial.write(message)
-            # await asyncio.sleep(0.01)  # Wait for response
-
-            response = self._serial.read(11)
-            if len(response) != 11:
-                raise IOError("Invalid response length")
+            # The exchange blocks for up to a second; keep it off the event loop
+            response = await asyncio.to_thread(self._transact, message, 11)
 
             # Parse response
             meas_temp = int.from_bytes(response[3:5], byteorder="big")
@@ -147,20 +362,20 @@ class RealSerialDevice(SerialDevice):
             traget_value = Decimal(str(target_temp / 10.0))  # Convert to correct scale
             self._target_temp = Temperature(value=traget_value)
 
-            self._lock = False
             return self._current_temp
 
-        except (serial.SerialException, ValueError) as e:
-            self._lock = False
+        except ValueError as e:
             raise IOError(f"Failed to read temperature: {str(e)}")
+        finally:
+            self._lock = False
 
     @require_connection
     async def set_temperature(self, temperature: Temperature) -> None:
-        try:
-            while self._lock:
-                await asyncio.sleep(0.01)
-            self._lock = True
+        while self._lock:
+            await asyncio.sleep(0.01)
+        self._lock = True
 
+        try:
             # Modbus RTU write single register command
             address = 0x2103  # Address for SP (set point)
             value = int(temperature.celsius * 10)  # Convert to correct scale
@@ -177,14 +392,10 @@ class RealSerialDevice(SerialDevice):
             )
             message += crc16(message)
 
-            self._serial.write(message)
-            # await asyncio.sleep(0.1)  # Wait for response
-            self._serial.read(8)
-            self._lock = False
+            await asyncio.to_thread(self._transact, message, 8)
 
-        except serial.SerialException as e:
+        finally:
             self._lock = False
-            raise IOError(f"Failed to set temperature: {str(e)}")
 
     async def is_connected(self) -> bool:
         return self._serial is not None and self._serial.is_open
@@ -212,6 +423,27 @@ class RealSerialDevice(SerialDevice):
             }
 
 
+class ReplaySerialDevice(RealSerialDevice):
+    def __init__(
+        self,
+        trace_path: str,
+        device_id: int = 1,
+        speed: float = 1.0,
+        strict: bool = False,
+    ):
+        super().__init__(trace_path, device_id)
+        self._speed = speed
+        self._strict = strict
+
+    def _open(self) -> None:
+        # Replays the recorded responses in order; speed 0 skips the delays
+        try:
+            self._serial = ReplayTransport(self._port, self._speed, self._strict)
+        except (OSError, ValueError) as e:
+            self._serial = None
+            raise ConnectionError(f"Failed to open serial trace {self._port}: {e}")
+
+
 class MockSerialDevice(SerialDevice):
     def __init__(
         self,
@@ -220,6 +452,7 @@ class MockSerialDevice(SerialDevice):
         connected: bool = True,
     ):
         self._connected = connected
+        self._port: str | None = None
         self._current_temp = self._to_temperature(current_temp or 0)
         self._target_temp = self._to_temperature(target_temp or 0)
 
@@ -233,12 +466,22 @@ class MockSerialDevice(SerialDevice):
     def _update_temperature(self) -> None:
         self._current_temp += (self._target_temp - self._current_temp) / 10
 
-    async def connect(self, port: str) -> None:
+    @property
+    def port(self) -> str | None:
+        return self._port
+
+    async def connect(self, port: str | None = None) -> None:
+        if port:
+            self._port = port
         self._connected = True
 
     async def disconnect(self) -> None:
         self._connected = False
 
+    async def change_port(self, port: str) -> None:
+        self._port = port
+        self._connected = True
+
     @require_connection
     async def read_temperature(self) -> Temperature:
         return self._current_temp
@@ -257,3 +500,55 @@ class MockSerialDevice(SerialDevice):
             "temperature_actual": self._current_temp.float_celsius,
             "temperature_status": "OK",
         }
+
+
+class SimulatedSerialDevice(SerialDevice):
+    def __init__(self, plant: ThermalPlant, clock: Clock):
+        self._plant = plant
+        self._clock = clock
+        self._last_update = clock.monotonic()
+        self._connected = True
+        self._port: str | None = None
+
+    def _update_temperature(self) -> None:
+        now = self._clock.monotonic()
+        self._plant.advance(now - self._last_update)
+        self._last_update = now
+
+    @property
+    def port(self) -> str | None:
+        return self._port
+
+    async def connect(self, port: str | None = None) -> None:
+        if port:
+            self._port = port
+        self._connected = True
+
+    async def disconnect(self) -> None:
+        self._connected = False
+
+    async def change_port(self, port: str) -> None:
+        self._port = port
+        self._connected = True
+
+    @require_connection
+    async def read_temperature(self) -> Temperature:
+        self._update_temperature()
+        # Match the 0.1 °C resolution of the real controller
+        return Temperature(round(self._plant.temperature, 1))
+
+    @require_connection
+    async def set_temperature(self, temperature: Temperature) -> None:
+        self._update_temperature()
+        self._plant.setpoint = temperature.float_celsius
+
+    async def is_connected(self) -> bool:
+        return self._connected
+
+    async def status(self) -> dict[str, float | str]:
+        temperature = await self.read_temperature()
+        return {
+            "temperature_setpoint": self._plant.setpoint,
+            "temperature_actual": temperature.float_celsius,
+            "temperature_status": "OK",
+        }
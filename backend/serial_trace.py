@@ -0,0 +1,164 @@
+import argparse
+import struct
+import sys
+import time
+from datetime import datetime
+from typing import IO, Iterator, NamedTuple
+
+TRACE_MAGIC = b"MBTR"
+TRACE_VERSION = 1
+# magic, version, wall-clock start time (epoch seconds)
+HEADER_STRUCT = struct.Struct("<4sB3xd")
+# direction, nanoseconds since trace start, payload length
+RECORD_STRUCT = struct.Struct("<BQH")
+
+DIRECTION_REQUEST = 0
+DIRECTION_RESPONSE = 1
+
+
+class TraceRecord(NamedTuple):
+    direction: int
+    timestamp_ns: int
+    payload: bytes
+
+
+class SerialTraceWriter:
+    def __init__(self, file_path: str):
+        self._file: IO[bytes] = open(file_path, "wb")
+        self._file.write(HEADER_STRUCT.pack(TRACE_MAGIC, TRACE_VERSION, time.time()))
+        self._file.flush()
+        self._started_ns = time.monotonic_ns()
+
+    def record(self, direction: int, payload: bytes) -> None:
+        self._file.write(
+            RECORD_STRUCT.pack(
+                direction, time.monotonic_ns() - self._started_ns, len(payload)
+            )
+        )
+        self._file.write(payload)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def read_trace(file_path: str) -> tuple[float, Iterator[TraceRecord]]:
+    f = open(file_path, "rb")
+    header = f.read(HEADER_STRUCT.size)
+    if len(header) == HEADER_STRUCT.size:
+        magic, version, started_at = HEADER_STRUCT.unpack(header)
+    if len(header) != HEADER_STRUCT.size or (magic, version) != (
+        TRACE_MAGIC,
+        TRACE_VERSION,
+    ):
+        f.close()
+        raise ValueError(f"{file_path} is not a version {TRACE_VERSION} serial trace")
+
+    def records() -> Iterator[TraceRecord]:
+        with f:
+            while header := f.read(RECORD_STRUCT.size):
+                if len(header) < RECORD_STRUCT.size:
+                    return
+                direction, timestamp_ns, length = RECORD_STRUCT.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    # Truncated by a crash while recording
+                    return
+                yield TraceRecord(direction, timestamp_ns, payload)
+
+    return started_at, records()
+
+
+class RecordingTransport:
+    def __init__(self, transport, writer: SerialTraceWriter):
+        self._transport = transport
+        self._writer = writer
+
+    def write(self, data: bytes) -> int:
+        self._writer.record(DIRECTION_REQUEST, bytes(data))
+        return self._transport.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._transport.read(size)
+        self._writer.record(DIRECTION_RESPONSE, data)
+        return data
+
+    @property
+    def timeout(self) -> float | None:
+        return self._transport.timeout
+
+    @timeout.setter
+    def timeout(self, value: float | None) -> None:
+        self._transport.timeout = value
+
+    def __getattr__(self, name: str):
+        return getattr(self._transport, name)
+
+
+class ReplayTransport:
+    def __init__(self, file_path: str, speed: float = 1.0, strict: bool = False):
+        _, records = read_trace(file_path)
+        self._records = records
+        self._speed = speed
+        self._strict = strict
+        self._last_request_ns: int | None = None
+        self.is_open = True
+        self.timeout = None
+        self.mismatches = 0
+
+    def _next_record(self, direction: int) -> TraceRecord | None:
+        for record in self._records:
+            if record.direction == direction:
+                return record
+        return None
+
+    def write(self, data: bytes) -> int:
+        record = self._next_record(DIRECTION_REQUEST)
+        if record is None:
+            raise EOFError("Serial trace exhausted")
+        if record.payload != bytes(data):
+            self.mismatches += 1
+            if self._strict:
+                raise ValueError(
+                    f"Request {bytes(data).hex()} does not match "
+                    f"recorded {record.payload.hex()}"
+                )
+        self._last_request_ns = record.timestamp_ns
+        return len(data)
+
+    def read(self, size: int = 1) -> bytes:
+        record = self._next_record(DIRECTION_RESPONSE)
+        if record is None:
+            return b""
+        if self._speed > 0 and self._last_request_ns is not None:
+            # Reproduce the device's response time, scaled by the replay speed
+            time.sleep(
+                (record.timestamp_ns - self._last_request_ns) / 1e9 / self._speed
+            )
+        return record.payload[:size]
+
+    def reset_input_buffer(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.is_open = False
+
+
+def dump_trace(file_path: str) -> None:
+    started_at, records = read_trace(file_path)
+    print(f"# trace started {datetime.fromtimestamp(started_at).isoformat()}")
+    for record in records:
+        arrow = ">" if record.direction == DIRECTION_REQUEST else "<"
+        print(f"{record.timestamp_ns / 1e9:14.6f} {arrow} {record.payload.hex(' ')}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect a recorded serial trace")
+    parser.add_argument("trace")
+    args = parser.parse_args()
+    dump_trace(args.trace)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import asyncio
-from typing import TypedDict, TYPE_CHECKING
+import json
+from typing import AsyncIterator, TypedDict, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from services import ProcedureExecutionService
@@ -12,8 +13,11 @@ from model import (
     StepStatus,
     RuntimeProcedureState,
 )
-from repository import IProcedureRepository
-from serial_device import SerialDevice
+from checkpoint import CheckpointJournal
+from clock import Clock, SystemClock
+from metrics import PROCEDURE_TICK_LATENESS_SECONDS
+from repository import IAsyncProcedureRepository
+from serial_device import DeviceUnavailableError, SerialDevice
 from temperature_logger import TemperatureLogger
 
 
@@ -23,18 +27,23 @@ class ProcedureResponse(TypedDict):
     procedure: dict[str, str | int | list[dict[str, float | int | str]]] | None
 
 
+MAX_REPORTED_IMPORT_ERRORS = 100
+
+
 class ProcedureService:
     def __init__(
         self,
-        repository: IProcedureRepository,
+        repository: IAsyncProcedureRepository,
         execution_service: "ProcedureExecutionService | None" = None,
     ):
         self._repository = repository
         self._execution_service = execution_service
-        self._initialize_default_procedures()
 
-    def _initialize_default_procedures(self) -> None:
-        if not self._repository.load_all():
+    async def initialize(self) -> None:
+        await self._initialize_default_procedures()
+
+    async def _initialize_default_procedures(self) -> None:
+        if not await self._repository.load_all():
             default_procedures = [
                 Procedure(
                     name="Example Procedure 1",
@@ -53,7 +62,7 @@ class ProcedureService:
                 ),
             ]
             for procedure in default_procedures:
-                self._repository.add(procedure)
+                await self._repository.add(procedure)
 
     def _create_procedure_steps(
         self, steps: list[tuple[float, int]]
@@ -63,10 +72,10 @@ class ProcedureService:
             for temp, duration in steps
         ]
 
-    def get_all(
+    async def get_all(
         self,
     ) -> dict[str, list[dict[str, str | int | list[dict[str, float | int | str]]]]]:
-        procedures = self._repository.load_all()
+        procedures = await self._repository.load_all()
         if self._execution_service:
             active_procedure = self._execution_service.get_active_procedure()
             if active_procedure:
@@ -79,6 +88,94 @@ class ProcedureService:
                 ]
         return {"procedures": [self._add_runtime_state(p) for p in procedures]}
 
+    async def list_page(
+        self, cursor: str | None = None, limit: int = 50, name: str | None = None
+    ) -> dict:
+        procedures, next_cursor = await self._repository.list_page(cursor, limit, name)
+        return {
+            "procedures": [self._add_runtime_state(p) for p in procedures],
+            "next_cursor": next_cursor,
+        }
+
+    async def export_batches(self, batch_size: int = 500) -> AsyncIterator[list[dict]]:
+        cursor = None
+        while True:
+            procedures, cursor = await self._repository.list_page(cursor, batch_size)
+            if procedures:
+                yield [dict(p) for p in procedures]
+            if not cursor:
+                return
+
+    def _parse_procedure(self, data: object) -> Procedure:
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        name = data.get("name")
+        steps = data.get("steps")
+        procedure_id = data.get("id")
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError("name must be a non-empty string")
+        if procedure_id is not None and not isinstance(procedure_id, str):
+            raise ValueError("id must be a string")
+        if not isinstance(steps, list) or not steps:
+            raise ValueError("steps must be a non-empty list")
+
+        parsed_steps = []
+        for i, step in enumerate(steps):
+            if not isinstance(step, dict):
+                raise ValueError(f"steps[{i}] must be an object")
+            temperature = step.get("temperature")
+            duration = step.get("duration")
+            if isinstance(temperature, bool) or not isinstance(
+                temperature, (int, float)
+            ):
+                raise ValueError(f"steps[{i}].temperature must be a number")
+            if isinstance(duration, bool) or not isinstance(duration, int):
+                raise ValueError(f"steps[{i}].duration must be an integer")
+            if duration < 0:
+                raise ValueError(f"steps[{i}].duration must not be negative")
+            parsed_steps.append((temperature, duration))
+
+        return Procedure(name, self._create_procedure_steps(parsed_steps), procedure_id)
+
+    async def import_procedures(
+        self, lines: AsyncIterator[bytes], batch_size: int = 500
+    ) -> dict:
+        # Valid procedures are committed a batch at a time; invalid lines are
+        # reported and skipped. A procedure whose id already exists replaces it.
+        # Each commit rewrites the whole library file, so the batch grows with
+        # the number imported so far: a large import costs O(log n) rewrites
+        # rather than one per batch_size procedures.
+        imported = 0
+        failed = 0
+        errors: list[dict] = []
+        batch: list[Procedure] = []
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                batch.append(self._parse_procedure(json.loads(line)))
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+                    errors.append({"line": line_number, "message": str(e)})
+                continue
+            if len(batch) >= max(batch_size, imported):
+                await self._repository.upsert_many(batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            await self._repository.upsert_many(batch)
+            imported += len(batch)
+
+        return {
+            "success": not failed,
+            "imported": imported,
+            "failed": failed,
+            "errors": errors,
+        }
+
     def _add_runtime_state(self, procedure: Procedure) -> dict:
         if (
             self._execution_service
@@ -91,11 +188,13 @@ class ProcedureService:
             runtime_state = RuntimeProcedureState(procedure)
             return runtime_state.to_dict()
 
-    def create(self, name: str, steps: list[tuple[float, int]]) -> ProcedureResponse:
+    async def create(
+        self, name: str, steps: list[tuple[float, int]]
+    ) -> ProcedureResponse:
         try:
             procedure_steps = self._create_procedure_steps(steps)
             new_procedure = Procedure(name, procedure_steps)
-            self._repository.add(new_procedure)
+            await self._repository.add(new_procedure)
             return {
                 "success": True,
                 "procedure": self._add_runtime_state(new_procedure),
@@ -108,9 +207,9 @@ class ProcedureService:
                 "procedure": None,
             }
 
-    def delete(self, procedure_id: str) -> ProcedureResponse:
+    async def delete(self, procedure_id: str) -> ProcedureResponse:
         try:
-            if self._repository.delete(procedure_id):
+            if await self._repository.delete(procedure_id):
                 return {
                     "success": True,
                     "message": f"Procedure {procedure_id} deleted successfully",
@@ -128,13 +227,13 @@ class ProcedureService:
                 "procedure": None,
             }
 
-    def update(
+    async def update(
         self, procedure_id: str, name: str, steps: list[tuple[float, int]]
     ) -> ProcedureResponse:
         procedure_steps = self._create_procedure_steps(steps)
         updated_procedure = Procedure(name, procedure_steps, procedure_id)
 
-        if self._repository.update(updated_procedure):
+        if await self._repository.update(updated_procedure):
             return {
                 "success": True,
                 "procedure": self._add_runtime_state(updated_procedure),
@@ -146,8 +245,8 @@ class ProcedureService:
             "procedure": None,
         }
 
-    def reset_procedure(self, procedure_id: str) -> ProcedureResponse:
-        procedures = self._repository.load_all()
+    async def reset_procedure(self, procedure_id: str) -> ProcedureResponse:
+        procedures = await self._repository.load_all()
         procedure = next((p for p in procedures if p.id == procedure_id), None)
 
         if not procedure:
@@ -159,7 +258,7 @@ class ProcedureService:
 
         # Reset the active procedure in execution service if it exists
         if self._execution_service:
-            self._execution_service.reset_active_procedure()
+            await self._execution_service.reset_active_procedure()
 
         return {
             "success": True,
@@ -169,21 +268,64 @@ class ProcedureService:
 
 
 class ProcedureExecutionService:
-    def __init__(self, repository: IProcedureRepository, device: SerialDevice):
+    def __init__(
+        self,
+        repository: IAsyncProcedureRepository,
+        device: SerialDevice,
+        temperature_logger: TemperatureLogger | None = None,
+        clock: Clock | None = None,
+        checkpoint_journal: CheckpointJournal | None = None,
+    ):
         self._repository = repository
         self._device = device
+        self._clock = clock or SystemClock()
         self._active_procedure: RuntimeProcedureState | None = None
         self._task: asyncio.Task | None = None
         self._should_stop = False
-        self._temperature_logger = TemperatureLogger()
+        self._temperature_logger = temperature_logger or TemperatureLogger()
+        self._checkpoint_journal = checkpoint_journal
+        self._state_version = 0
+        self._state_changed = asyncio.Event()
+
+        interrupted_run = checkpoint_journal.load() if checkpoint_journal else None
+        if interrupted_run:
+            print(
+                f"Found interrupted run of {interrupted_run.procedure.name} at step "
+                f"{interrupted_run.step}, {interrupted_run.elapsed} s; "
+                "POST /procedures/interrupted/resume to continue it"
+            )
 
     def get_active_procedure(self) -> RuntimeProcedureState | None:
         return self._active_procedure
 
-    def reset_active_procedure(self) -> None:
+    def get_state_version(self) -> int:
+        return self._state_version
+
+    def _notify_state_change(self) -> None:
+        self._state_version += 1
+        # Wake every waiter on the current event and hand later ones a fresh one
+        self._state_changed.set()
+        self._state_changed = asyncio.Event()
+
+    async def wait_for_state_change(
+        self, since_version: int, timeout: float | None = None
+    ) -> int:
+        if self._state_version == since_version:
+            try:
+                await asyncio.wait_for(self._state_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._state_version
+
+    async def wait_until_finished(self) -> None:
+        if self._task:
+            await self._task
+
+    async def reset_active_procedure(self) -> None:
         self._active_procedure = None
         self._task = None
         self._should_stop = False
+        self._notify_state_change()
 
     async def start_procedure(self, procedure_id: str) -> ProcedureResponse:
         if self._active_procedure:
@@ -193,7 +335,7 @@ class ProcedureExecutionService:
                 "procedure": None,
             }
 
-        procedures = self._repository.load_all()
+        procedures = await self._repository.load_all()
         procedure = next((p for p in procedures if p.id == procedure_id), None)
 
         if not procedure:
@@ -202,6 +344,13 @@ class ProcedureExecutionService:
                 "message": "Procedure not found",
                 "procedure": None,
             }
+        # Checked again: another start may have won while the library loaded
+        if self._active_procedure:
+            return {
+                "success": False,
+                "message": "Another procedure is already running",
+                "procedure": None,
+            }
 
         self._active_procedure = RuntimeProcedureState(procedure)
         self._active_procedure.status = ProcedureStatus.RUNNING
@@ -210,8 +359,109 @@ class ProcedureExecutionService:
 
         # Start a new temperature log file
         self._temperature_logger.start_new_log(procedure_id, procedure.name)
+        if self._checkpoint_journal:
+            self._checkpoint_journal.begin(
+                procedure,
+                self._temperature_logger.get_current_log_file(),
+                self._clock.now(),
+            )
 
         self._task = asyncio.create_task(self._run_procedure())
+        self._notify_state_change()
+
+        return {
+            "success": True,
+            "procedure": self._active_procedure.to_dict(),
+            "message": "",
+        }
+
+    async def get_interrupted_run(self) -> dict | None:
+        if not self._checkpoint_journal or (
+            self._active_procedure
+            and self._active_procedure.status == ProcedureStatus.RUNNING
+        ):
+            return None
+        interrupted_run = self._checkpoint_journal.load()
+        return interrupted_run.to_dict() if interrupted_run else None
+
+    async def discard_interrupted_run(self) -> None:
+        if self._checkpoint_journal and not (
+            self._active_procedure
+            and self._active_procedure.status == ProcedureStatus.RUNNING
+        ):
+            self._checkpoint_journal.clear()
+
+    async def resume_procedure(self) -> ProcedureResponse:
+        # A run that failed on a device error stays active as FAILED and is
+        # exactly the one offered for resume, so only a running one blocks it
+        if (self._task and not self._task.done()) or (
+            self._active_procedure
+            and self._active_procedure.status == ProcedureStatus.RUNNING
+        ):
+            return {
+                "success": False,
+                "message": "Another procedure is already running",
+                "procedure": None,
+            }
+
+        interrupted_run = (
+            self._checkpoint_journal.load() if self._checkpoint_journal else None
+        )
+        if not interrupted_run:
+            return {
+                "success": False,
+                "message": "No interrupted procedure to resume",
+                "procedure": None,
+            }
+
+        try:
+            self._temperature_logger.resume_log(
+                interrupted_run.log_file, interrupted_run.log_offset
+            )
+        except OSError as e:
+            return {
+                "success": False,
+                "message": f"Cannot continue log of interrupted run: {str(e)}",
+                "procedure": None,
+            }
+
+        self._active_procedure = RuntimeProcedureState(interrupted_run.procedure)
+        self._active_procedure.status = ProcedureStatus.RUNNING
+        self._active_procedure.current_step = interrupted_run.step
+        completed = zip(
+            interrupted_run.procedure.steps[: interrupted_run.step],
+            self._active_procedure.step_states,
+        )
+        for step, state in completed:
+            state.status = StepStatus.COMPLETED
+            state.elapsed_time = step.duration
+        if interrupted_run.step < len(self._active_procedure.step_states):
+            resumed_state = self._active_procedure.step_states[interrupted_run.step]
+            resumed_state.status = StepStatus.RUNNING
+            resumed_state.elapsed_time = interrupted_run.elapsed
+        self._should_stop = False
+
+        # Rebuild the statistics of the samples logged before the interruption
+        step_states = self._active_procedure.step_states
+        for record in self._temperature_logger.get_temperature_log(
+            interrupted_run.log_file
+        ):
+            if record["step"] is not None and record["step"] < len(step_states):
+                statistics = step_states[record["step"]].statistics
+                # Same time base as the live run; logs written before the
+                # elapsed column existed fall back to the sample count
+                elapsed = record["elapsed"]
+                statistics.update(
+                    record["setpoint"],
+                    record["actual"],
+                    statistics.samples if elapsed is None else elapsed,
+                )
+        self._checkpoint_journal.resume()
+
+        self._task = asyncio.create_task(
+            self._run_procedure(interrupted_run.step, interrupted_run.elapsed)
+        )
+        self._notify_state_change()
 
         return {
             "success": True,
@@ -247,12 +497,44 @@ class ProcedureExecutionService:
                 current_state.status = StepStatus.QUEUED
 
         self._active_procedure.status = ProcedureStatus.STOPPED
+        self._save_statistics()
+        self._temperature_logger.close_log()
+        if self._checkpoint_journal:
+            self._checkpoint_journal.clear()
         result = self._active_procedure.to_dict()
         self._active_procedure = None
         self._task = None
+        self._notify_state_change()
         return {"success": True, "procedure": result, "message": ""}
 
-    async def _run_procedure(self) -> None:
+    def _save_statistics(self) -> None:
+        try:
+            self._temperature_logger.save_statistics(
+                self._active_procedure.statistics()
+            )
+        except Exception as e:
+            print(f"Error saving procedure statistics: {e}")
+
+    def _checkpoint(self, step: int, elapsed: int, force: bool = False) -> None:
+        if self._checkpoint_journal and (
+            force or self._checkpoint_journal.is_due(elapsed)
+        ):
+            self._checkpoint_journal.record(
+                step, elapsed, self._temperature_logger.get_log_offset()
+            )
+
+    async def _send_setpoint(self, temperature: Temperature) -> bool:
+        try:
+            await self._device.set_temperature(temperature)
+        except (DeviceUnavailableError, ConnectionError):
+            raise
+        except IOError as e:
+            # Retried on the next tick; a dead device opens the circuit breaker
+            print(f"Retrying setpoint write: {e}")
+            return False
+        return True
+
+    async def _run_procedure(self, start_step: int = 0, start_elapsed: int = 0) -> None:
         try:
             for i, (step, state) in enumerate(
                 zip(
@@ -260,36 +542,68 @@ class ProcedureExecutionService:
                     self._active_procedure.step_states,
                 )
             ):
+                if i < start_step:
+                    continue
                 if self._should_stop:
                     return
 
                 self._active_procedure.current_step = i
                 state.status = StepStatus.RUNNING
-                state.elapsed_time = 0
+                state.elapsed_time = start_elapsed if i == start_step else 0
+                self._checkpoint(i, state.elapsed_time, force=True)
+                self._notify_state_change()
 
-                await self._device.set_temperature(step.temperature)
+                setpoint_sent = await self._send_setpoint(step.temperature)
 
-                for _ in range(step.duration):
+                for _ in range(step.duration - state.elapsed_time):
                     if self._should_stop:
                         return
+                    tick_started = self._clock.monotonic()
+                    if not setpoint_sent:
+                        setpoint_sent = await self._send_setpoint(step.temperature)
 
                     # Log temperature data
-                    actual_temp = await self._device.read_temperature()
-                    self._temperature_logger.log_temperature(
-                        self._active_procedure.procedure.id,
-                        step.temperature,
-                        actual_temp,
+                    try:
+                        actual_temp = await self._device.read_temperature()
+                    except (DeviceUnavailableError, ConnectionError):
+                        raise
+                    except IOError as e:
+                        # A sample lost to line noise is not worth the run
+                        print(f"Skipping temperature sample: {e}")
+                        actual_temp = None
+                    if actual_temp is not None:
+                        self._temperature_logger.log_temperature(
+                            self._active_procedure.procedure.id,
+                            step.temperature,
+                            actual_temp,
+                            step=i,
+                            elapsed=state.elapsed_time,
+                        )
+                        state.statistics.update(
+                            step.temperature.float_celsius,
+                            actual_temp.float_celsius,
+                            state.elapsed_time,
+                        )
+
+                    await self._clock.sleep(1)
+                    PROCEDURE_TICK_LATENESS_SECONDS.observe(
+                        max(0.0, self._clock.monotonic() - tick_started - 1)
                     )
-
-                    await asyncio.sleep(1)
                     state.elapsed_time += 1
+                    self._checkpoint(i, state.elapsed_time)
+                    self._notify_state_change()
 
                 state.status = StepStatus.COMPLETED
+                self._save_statistics()
+                self._notify_state_change()
 
             if not self._should_stop:
                 self._active_procedure.status = ProcedureStatus.COMPLETED
                 # Reset temperature to 0°C after successful completion
                 await self._device.set_temperature(Temperature(0))
+                if self._checkpoint_journal:
+                    self._checkpoint_journal.clear()
+                self._notify_state_change()
         except Exception as e:
             print(f"Error running procedure: {e}")
             if self._active_procedure:
@@ -299,6 +613,13 @@ class ProcedureExecutionService:
                         self._active_procedure.current_step
                     ]
                     current_state.status = StepStatus.FAILED
+                self._save_statistics()
+                self._notify_state_change()
         finally:
+            if not self._should_stop:
+                self._temperature_logger.close_log()
+                if self._checkpoint_journal:
+                    # A failed run stays in the journal so it can be resumed
+                    self._checkpoint_journal.close()
             if self._task and self._task.done():
                 self._task = None
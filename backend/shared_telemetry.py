@@ -0,0 +1,164 @@
+import argparse
+import struct
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+SHARED_TELEMETRY_MAGIC = b"TLMY"
+SHARED_TELEMETRY_VERSION = 1
+# magic, version, capacity, sequence, samples written, interval
+HEADER_STRUCT = struct.Struct("<4sIIxxxxQQd")
+SEQUENCE_OFFSET = 16
+WRITTEN_OFFSET = 24
+# timestamp, setpoint, actual
+SAMPLE_STRUCT = struct.Struct("<ddd")
+SEQUENCE_STRUCT = struct.Struct("<Q")
+
+
+class SharedTelemetryBuffer:
+    # Single writer; the sequence counter is odd while a sample is being
+    # written, so readers retry instead of returning a torn sample
+    def __init__(self, name: str, capacity: int, interval: float = 1.0):
+        size = HEADER_STRUCT.size + capacity * SAMPLE_STRUCT.size
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a process that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._capacity = capacity
+        self._sequence = 0
+        self._written = 0
+        HEADER_STRUCT.pack_into(
+            self._shm.buf,
+            0,
+            SHARED_TELEMETRY_MAGIC,
+            SHARED_TELEMETRY_VERSION,
+            capacity,
+            0,
+            0,
+            interval,
+        )
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def append(self, timestamp: float, setpoint: float, actual: float) -> None:
+        buf = self._shm.buf
+        self._sequence += 1
+        SEQUENCE_STRUCT.pack_into(buf, SEQUENCE_OFFSET, self._sequence)
+        SAMPLE_STRUCT.pack_into(
+            buf,
+            HEADER_STRUCT.size + (self._written % self._capacity) * SAMPLE_STRUCT.size,
+            timestamp,
+            setpoint,
+            actual,
+        )
+        self._written += 1
+        SEQUENCE_STRUCT.pack_into(buf, WRITTEN_OFFSET, self._written)
+        self._sequence += 1
+        SEQUENCE_STRUCT.pack_into(buf, SEQUENCE_OFFSET, self._sequence)
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedTelemetryReader:
+    def __init__(self, name: str):
+        if sys.version_info >= (3, 13):
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # Otherwise the resource tracker unlinks the writer's segment when
+            # this reader exits
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        magic, version, self._capacity, _, _, self._interval = (
+            HEADER_STRUCT.unpack_from(self._shm.buf)
+        )
+        if magic != SHARED_TELEMETRY_MAGIC or version != SHARED_TELEMETRY_VERSION:
+            self._shm.close()
+            raise ValueError(
+                f"{name} is not a version {SHARED_TELEMETRY_VERSION} telemetry buffer"
+            )
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    def _read_consistent(self, read, retries: int = 100):
+        buf = self._shm.buf
+        for _ in range(retries):
+            (sequence,) = SEQUENCE_STRUCT.unpack_from(buf, SEQUENCE_OFFSET)
+            if sequence % 2:
+                # The writer was preempted mid-sample; let it finish
+                time.sleep(0)
+                continue
+            (written,) = SEQUENCE_STRUCT.unpack_from(buf, WRITTEN_OFFSET)
+            result = read(buf, written)
+            if SEQUENCE_STRUCT.unpack_from(buf, SEQUENCE_OFFSET)[0] == sequence:
+                return result
+            time.sleep(0)
+        raise TimeoutError("Shared telemetry buffer is being rewritten too fast")
+
+    def _slot_offset(self, index: int) -> int:
+        return HEADER_STRUCT.size + (index % self._capacity) * SAMPLE_STRUCT.size
+
+    def latest(self) -> tuple[float, float, float] | None:
+        def read(buf, written: int):
+            if not written:
+                return None
+            return SAMPLE_STRUCT.unpack_from(buf, self._slot_offset(written - 1))
+
+        return self._read_consistent(read)
+
+    def snapshot(self, count: int | None = None) -> dict[str, list[float]]:
+        def read(buf, written: int):
+            size = min(written, self._capacity, count or self._capacity)
+            return [
+                SAMPLE_STRUCT.unpack_from(buf, self._slot_offset(index))
+                for index in range(written - size, written)
+            ]
+
+        samples = self._read_consistent(read)
+        return {
+            "timestamps": [sample[0] for sample in samples],
+            "setpoint": [sample[1] for sample in samples],
+            "actual": [sample[2] for sample in samples],
+        }
+
+    def close(self) -> None:
+        self._shm.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Print live temperatures from a shared telemetry buffer"
+    )
+    parser.add_argument("name")
+    parser.add_argument("--follow", action="store_true")
+    args = parser.parse_args()
+
+    reader = SharedTelemetryReader(args.name)
+    try:
+        last = None
+        while True:
+            sample = reader.latest()
+            if sample and sample != last:
+                timestamp, setpoint, actual = sample
+                print(f"{timestamp:.3f} setpoint={setpoint:.1f} actual={actual:.1f}")
+                last = sample
+            if not args.follow:
+                return 0
+            time.sleep(reader.interval / 2)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from clock import VirtualClock
+from model import Procedure
+from repository import (
+    InMemoryProcedureRepository,
+    JsonProcedureRepository,
+    ThreadedProcedureRepository,
+)
+from serial_device import SimulatedSerialDevice
+from services import ProcedureExecutionService
+from temperature_logger import TemperatureLogger
+from thermal_plant import ThermalPlant
+
+
+async def simulate_procedure(
+    procedure: Procedure,
+    output_dir: str,
+    start: datetime | None = None,
+    initial_temperature: float = 20.0,
+    time_constant: float = 30.0,
+) -> dict:
+    clock = VirtualClock(start)
+    device = SimulatedSerialDevice(
+        ThermalPlant(temperature=initial_temperature, time_constant=time_constant),
+        clock,
+    )
+    temperature_logger = TemperatureLogger(
+        data_dir=os.path.join(output_dir, "temperature_logs"),
+        rollup_dir=os.path.join(output_dir, "temperature_rollups"),
+        clock=clock,
+    )
+    execution_service = ProcedureExecutionService(
+        ThreadedProcedureRepository(InMemoryProcedureRepository([procedure])),
+        device,
+        temperature_logger,
+        clock,
+    )
+
+    result = await execution_service.start_procedure(procedure.id)
+    if not result["success"]:
+        raise RuntimeError(result["message"])
+    await execution_service.wait_until_finished()
+
+    return {
+        "procedure": execution_service.get_active_procedure().to_dict(),
+        "log_file": temperature_logger.get_current_log_file(),
+        "started_at": (clock.now() - timedelta(seconds=clock.elapsed)).isoformat(),
+        "cycle_time": clock.elapsed,
+    }
+
+
+async def simulate_procedures(
+    procedures: list[Procedure],
+    output_dir: str,
+    initial_temperature: float = 20.0,
+    time_constant: float = 30.0,
+) -> list[dict]:
+    # Runs are laid out back to back in virtual time, as on a real station
+    start = datetime.now().replace(microsecond=0)
+    results = []
+    for procedure in procedures:
+        result = await simulate_procedure(
+            procedure, output_dir, start, initial_temperature, time_constant
+        )
+        start += timedelta(seconds=result["cycle_time"])
+        results.append(result)
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Run procedures against a thermal plant model in virtual time"
+    )
+    parser.add_argument(
+        "procedure_ids", nargs="*", help="procedures to run (default: all)"
+    )
+    parser.add_argument("--repository", default="data/procedures.json")
+    parser.add_argument("--output", default="data/simulations")
+    parser.add_argument("--initial-temperature", type=float, default=20.0)
+    parser.add_argument("--time-constant", type=float, default=30.0)
+    args = parser.parse_args()
+
+    procedures = JsonProcedureRepository(args.repository).load_all()
+    if args.procedure_ids:
+        procedures = [p for p in procedures if p.id in args.procedure_ids]
+
+    output_dir = os.path.abspath(
+        os.path.join(args.output, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    )
+    started = time.perf_counter()
+    results = asyncio.run(
+        simulate_procedures(
+            procedures, output_dir, args.initial_temperature, args.time_constant
+        )
+    )
+    wall_time = time.perf_counter() - started
+
+    summary = [
+        {
+            "id": result["procedure"]["id"],
+            "name": result["procedure"]["name"],
+            "status": result["procedure"]["status"],
+            "cycle_time": result["cycle_time"],
+            "log_file": result["log_file"],
+            "steps": [step["statistics"] for step in result["procedure"]["steps"]],
+        }
+        for result in results
+    ]
+    print(json.dumps(summary, indent=2))
+    print(
+        f"Simulated {len(results)} procedures "
+        f"({sum(r['cycle_time'] for r in results):.0f} s) in {wall_time:.3f} s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
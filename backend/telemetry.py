@@ -0,0 +1,243 @@
+import asyncio
+import time
+from array import array
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from services import ProcedureExecutionService
+
+from serial_device import SerialDevice
+from shared_telemetry import SharedTelemetryBuffer
+
+
+class TelemetryRingBuffer:
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._timestamps = array("d", [0.0]) * capacity
+        self._setpoints = array("d", [0.0]) * capacity
+        self._actuals = array("d", [0.0]) * capacity
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def clear(self) -> None:
+        self._next = 0
+        self._size = 0
+
+    def append(self, timestamp: float, setpoint: float, actual: float) -> None:
+        self._timestamps[self._next] = timestamp
+        self._setpoints[self._next] = setpoint
+        self._actuals[self._next] = actual
+        self._next = (self._next + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+
+    def _ordered(self, values: array) -> list[float]:
+        start = (self._next - self._size) % self._capacity
+        if start + self._size <= self._capacity:
+            return values[start : start + self._size].tolist()
+        return (values[start:] + values[: self._next]).tolist()
+
+    def snapshot(self) -> dict[str, list[float]]:
+        return {
+            "timestamps": self._ordered(self._timestamps),
+            "setpoint": self._ordered(self._setpoints),
+            "actual": self._ordered(self._actuals),
+        }
+
+
+STATUS_CHANNEL = "status"
+PROCEDURE_CHANNEL = "procedure"
+ALARMS_CHANNEL = "alarms"
+
+
+def telemetry_channel(device_id: str) -> str:
+    return f"telemetry:{device_id}"
+
+
+class TelemetrySubscription:
+    def __init__(self, channels: set[str], queue_size: int):
+        self.channels = set(channels)
+        self.queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue(maxsize=queue_size)
+
+    def put(self, channel: str, message: dict) -> None:
+        if self.queue.full():
+            # Slow clients skip stale messages instead of growing the queue
+            self.queue.get_nowait()
+        self.queue.put_nowait((channel, message))
+
+
+class TelemetryHub:
+    def __init__(
+        self,
+        device_id: str = "default",
+        history_seconds: int = 600,
+        interval: float = 1.0,
+        client_queue_size: int = 60,
+    ):
+        self._device_id = device_id
+        self._interval = interval
+        self._client_queue_size = client_queue_size
+        self._history = TelemetryRingBuffer(max(1, int(history_seconds / interval)))
+        self._subscriptions: list[TelemetrySubscription] = []
+
+    @property
+    def device_id(self) -> str:
+        return self._device_id
+
+    @property
+    def channel(self) -> str:
+        return telemetry_channel(self._device_id)
+
+    @property
+    def channels(self) -> list[str]:
+        return [self.channel, PROCEDURE_CHANNEL, ALARMS_CHANNEL]
+
+    def subscribe(self, channels: set[str] | None = None) -> TelemetrySubscription:
+        subscription = TelemetrySubscription(
+            {STATUS_CHANNEL} if channels is None else channels,
+            self._client_queue_size,
+        )
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TelemetrySubscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    def backfill_message(self) -> dict:
+        return {
+            "type": "backfill",
+            "device_id": self._device_id,
+            "interval": self._interval,
+            **self._history.snapshot(),
+        }
+
+    def _publish(self, channel: str, message: dict) -> None:
+        for subscription in self._subscriptions:
+            if channel in subscription.channels:
+                subscription.put(channel, message)
+
+
+class TelemetryService(TelemetryHub):
+    def __init__(
+        self,
+        device: SerialDevice,
+        execution_service: "ProcedureExecutionService",
+        device_id: str = "default",
+        history_seconds: int = 600,
+        interval: float = 1.0,
+        client_queue_size: int = 60,
+        shared_memory_name: str | None = None,
+    ):
+        super().__init__(device_id, history_seconds, interval, client_queue_size)
+        self._device = device
+        self._execution_service = execution_service
+        self._shared_memory_name = shared_memory_name
+        self._shared_buffer: SharedTelemetryBuffer | None = None
+        self._task: asyncio.Task | None = None
+        self._last_device_status = "OK"
+        self._last_procedure: dict | None = None
+
+    def start(self) -> None:
+        if not self._task:
+            if self._shared_memory_name:
+                self._shared_buffer = SharedTelemetryBuffer(
+                    self._shared_memory_name, self._history.capacity, self._interval
+                )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._shared_buffer:
+            self._shared_buffer.close()
+            self._shared_buffer = None
+
+    def _check_alarms(
+        self, device_status: str, procedure: dict | None, timestamp: float
+    ) -> None:
+        if device_status != self._last_device_status:
+            self._publish(
+                ALARMS_CHANNEL,
+                {
+                    "type": (
+                        "device_recovered" if device_status == "OK" else "device_error"
+                    ),
+                    "device_id": self._device_id,
+                    "message": device_status,
+                    "timestamp": timestamp,
+                },
+            )
+            self._last_device_status = device_status
+
+        if (
+            procedure
+            and procedure["status"] == "failed"
+            and (not self._last_procedure or self._last_procedure["status"] != "failed")
+        ):
+            self._publish(
+                ALARMS_CHANNEL,
+                {
+                    "type": "procedure_failed",
+                    "device_id": self._device_id,
+                    "message": f"Procedure {procedure['name']} failed",
+                    "timestamp": timestamp,
+                },
+            )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if not await self._device.is_connected():
+                    await self._device.connect()
+
+                status_data = await self._device.status()
+                timestamp = time.time()
+                if status_data["temperature_status"] == "OK":
+                    self._history.append(
+                        timestamp,
+                        status_data["temperature_setpoint"],
+                        status_data["temperature_actual"],
+                    )
+                    if self._shared_buffer:
+                        self._shared_buffer.append(
+                            timestamp,
+                            status_data["temperature_setpoint"],
+                            status_data["temperature_actual"],
+                        )
+                self._publish(
+                    self.channel,
+                    {
+                        "timestamp": timestamp,
+                        "setpoint": status_data["temperature_setpoint"],
+                        "actual": status_data["temperature_actual"],
+                        "status": status_data["temperature_status"],
+                    },
+                )
+
+                active_procedure = self._execution_service.get_active_procedure()
+                procedure = active_procedure.to_dict() if active_procedure else None
+                self._check_alarms(
+                    status_data["temperature_status"], procedure, timestamp
+                )
+                if procedure != self._last_procedure:
+                    self._publish(PROCEDURE_CHANNEL, {"procedure": procedure})
+                    self._last_procedure = procedure
+
+                if procedure:
+                    status_data["active_procedure"] = procedure
+                self._publish(STATUS_CHANNEL, status_data)
+            except Exception as e:
+                print(f"Error acquiring telemetry: {e}")
+            await asyncio.sleep(self._interval)
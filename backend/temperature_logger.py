@@ -1,24 +1,39 @@
 import os
 import csv
+import json
 import logging
+import time
 from datetime import datetime
-from typing import TypedDict
+from typing import IO, TypedDict
+from clock import Clock, SystemClock
+from metrics import LOG_WRITE_SECONDS
 from model import Temperature
-
+from temperature_rollup import RollupRecord, TemperatureRollups
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 
+LOG_FIELDNAMES = ["timestamp", "setpoint", "actual", "step", "elapsed"]
+
+
 class TemperatureRecord(TypedDict):
     timestamp: str
     setpoint: float
     actual: float
+    step: int | None
+    elapsed: int | None
 
 
 class TemperatureLogger:
-    def __init__(self, data_dir: str = "data/temperature_logs"):
+    def __init__(
+        self,
+        data_dir: str = "data/temperature_logs",
+        rollup_dir: str = "data/temperature_rollups",
+        controller_id: str = "default",
+        clock: Clock | None = None,
+    ):
         # Get absolute paths for debugging
         current_file = os.path.abspath(__file__)
         logger.debug(f"Current file: {current_file}")
@@ -39,6 +54,12 @@ class TemperatureLogger:
 
         self._ensure_data_directory()
         self._current_log_file: str | None = None
+        self._log_handle: IO[str] | None = None
+        self._log_writer: csv.DictWriter | None = None
+        self._clock = clock or SystemClock()
+        self._rollups = TemperatureRollups(
+            os.path.join(backend_dir, rollup_dir), controller_id
+        )
 
     def _ensure_data_directory(self) -> None:
         """Create the data directory if it doesn't exist"""
@@ -67,20 +88,19 @@ class TemperatureLogger:
         """Start a new log file for a procedure run"""
         # Ensure directory exists before creating file
         self._ensure_data_directory()
+        self._close_log_handle()
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = self._clock.now().strftime("%Y%m%d_%H%M%S")
         safe_name = self._sanitize_filename(procedure_name)
         filename = f"{timestamp}_{safe_name}.csv"
         self._current_log_file = os.path.join(self.data_dir, filename)
         logger.info(f"Starting new temperature log file: {self._current_log_file}")
 
-        # Create new file with headers
+        # Create new file with headers and keep it open for appending rows
         try:
-            with open(self._current_log_file, "w", newline="") as f:
-                writer = csv.DictWriter(
-                    f, fieldnames=["timestamp", "setpoint", "actual"]
-                )
-                writer.writeheader()
+            self._open_log_handle("w")
+            self._log_writer.writeheader()
+            self._log_handle.flush()
             logger.info("Successfully created new log file with headers")
             # Verify file was created
             if os.path.exists(self._current_log_file):
@@ -91,8 +111,46 @@ class TemperatureLogger:
             logger.error(f"Error creating log file: {e}")
             raise
 
+    def resume_log(self, log_file: str, offset: int) -> None:
+        """Continue an interrupted run's log file from a checkpointed offset"""
+        self._close_log_handle()
+        self._current_log_file = log_file
+        # Rows written after the checkpoint are logged again once the run resumes
+        with open(log_file, "r+b") as f:
+            f.truncate(offset)
+        self._open_log_handle("a")
+        logger.info(f"Resuming temperature log file: {log_file} at byte {offset}")
+
+    def get_log_offset(self) -> int:
+        """Get the byte offset just past the last row of the current log file"""
+        if self._log_handle:
+            return self._log_handle.tell()
+        if self._current_log_file and os.path.exists(self._current_log_file):
+            return os.path.getsize(self._current_log_file)
+        return 0
+
+    def _open_log_handle(self, mode: str) -> None:
+        self._log_handle = open(self._current_log_file, mode, newline="")
+        self._log_writer = csv.DictWriter(self._log_handle, fieldnames=LOG_FIELDNAMES)
+
+    def _close_log_handle(self) -> None:
+        if self._log_handle:
+            self._log_handle.close()
+        self._log_handle = None
+        self._log_writer = None
+
+    def close_log(self) -> None:
+        """Close the current log file and write pending rollups"""
+        self._close_log_handle()
+        self.flush_rollups()
+
     def log_temperature(
-        self, procedure_id: str, setpoint: Temperature, actual: Temperature
+        self,
+        procedure_id: str,
+        setpoint: Temperature,
+        actual: Temperature,
+        step: int | None = None,
+        elapsed: int | None = None,
     ) -> None:
         """Log temperature data for a specific procedure"""
         if not self._current_log_file:
@@ -100,22 +158,39 @@ class TemperatureLogger:
             logging.error(error_msg)
             raise RuntimeError(error_msg)
 
+        started = time.perf_counter()
+        now = self._clock.now()
         record: TemperatureRecord = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "setpoint": setpoint.float_celsius,
             "actual": actual.float_celsius,
+            "step": step,
+            "elapsed": elapsed,
         }
 
         try:
-            with open(self._current_log_file, "a", newline="") as f:
-                writer = csv.DictWriter(
-                    f, fieldnames=["timestamp", "setpoint", "actual"]
-                )
-                writer.writerow(record)
+            if not self._log_handle:
+                self._open_log_handle("a")
+            self._log_writer.writerow(record)
+            # Flush every row so the log survives a crash mid-run
+            self._log_handle.flush()
         except Exception as e:
             logging.error(f"Error logging temperature data: {e}")
             raise
 
+        self._rollups.add(now, record["setpoint"], record["actual"])
+        LOG_WRITE_SECONDS.observe(time.perf_counter() - started)
+
+    def flush_rollups(self) -> None:
+        """Write partially filled rollup buckets to disk"""
+        self._rollups.flush()
+
+    def query_history(
+        self, start: datetime, end: datetime, resolution: int
+    ) -> tuple[int, list[RollupRecord]]:
+        """Query rollups from the coarsest tier satisfying the resolution"""
+        return self._rollups.query(start, end, resolution)
+
     def get_temperature_log(self, filepath: str) -> list[TemperatureRecord]:
         """Retrieve temperature log from a specific file"""
         if not os.path.exists(filepath):
@@ -131,6 +206,10 @@ class TemperatureLogger:
                             "timestamp": row["timestamp"],
                             "setpoint": float(row["setpoint"]),
                             "actual": float(row["actual"]),
+                            "step": int(row["step"]) if row.get("step") else None,
+                            "elapsed": (
+                                int(row["elapsed"]) if row.get("elapsed") else None
+                            ),
                         }
                     )
             return records
@@ -138,6 +217,23 @@ class TemperatureLogger:
             print(f"Error reading temperature log: {e}")
             return []
 
+    def get_statistics_file(self, log_file: str) -> str:
+        """Get the path of the statistics file stored alongside a log file"""
+        return f"{os.path.splitext(log_file)[0]}.stats.json"
+
+    def save_statistics(self, statistics: list[dict]) -> None:
+        """Store per-step run statistics alongside the current log file"""
+        if not self._current_log_file:
+            return
+
+        stats_file = self.get_statistics_file(self._current_log_file)
+        try:
+            with open(stats_file, "w") as f:
+                json.dump({"steps": statistics}, f, indent=2)
+        except Exception as e:
+            logging.error(f"Error saving run statistics: {e}")
+            raise
+
     def get_current_log_file(self) -> str | None:
         """Get the path of the current log file"""
         return self._current_log_file
@@ -0,0 +1,194 @@
+import os
+import csv
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import TypedDict
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TIERS = (10, 60, 3600)
+ROLLUP_FIELDNAMES = [
+    "timestamp",
+    "samples",
+    "setpoint_min",
+    "setpoint_max",
+    "setpoint_mean",
+    "actual_min",
+    "actual_max",
+    "actual_mean",
+]
+
+
+class RollupRecord(TypedDict):
+    timestamp: str
+    samples: int
+    setpoint_min: float
+    setpoint_max: float
+    setpoint_mean: float
+    actual_min: float
+    actual_max: float
+    actual_mean: float
+
+
+@dataclass
+class RollupBucket:
+    start: datetime
+    epoch: int = 0
+    samples: int = 0
+    setpoint_min: float = float("inf")
+    setpoint_max: float = float("-inf")
+    setpoint_sum: float = 0.0
+    actual_min: float = float("inf")
+    actual_max: float = float("-inf")
+    actual_sum: float = 0.0
+
+    def add(self, setpoint: float, actual: float) -> None:
+        self.samples += 1
+        self.setpoint_min = min(self.setpoint_min, setpoint)
+        self.setpoint_max = max(self.setpoint_max, setpoint)
+        self.setpoint_sum += setpoint
+        self.actual_min = min(self.actual_min, actual)
+        self.actual_max = max(self.actual_max, actual)
+        self.actual_sum += actual
+
+    def to_record(self) -> RollupRecord:
+        return {
+            "timestamp": self.start.isoformat(),
+            "samples": self.samples,
+            "setpoint_min": self.setpoint_min,
+            "setpoint_max": self.setpoint_max,
+            "setpoint_mean": self.setpoint_sum / self.samples,
+            "actual_min": self.actual_min,
+            "actual_max": self.actual_max,
+            "actual_mean": self.actual_sum / self.samples,
+        }
+
+
+def _to_local_naive(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def _merge_records(first: RollupRecord, second: RollupRecord) -> RollupRecord:
+    samples = first["samples"] + second["samples"]
+    return {
+        "timestamp": first["timestamp"],
+        "samples": samples,
+        "setpoint_min": min(first["setpoint_min"], second["setpoint_min"]),
+        "setpoint_max": max(first["setpoint_max"], second["setpoint_max"]),
+        "setpoint_mean": (
+            first["setpoint_mean"] * first["samples"]
+            + second["setpoint_mean"] * second["samples"]
+        )
+        / samples,
+        "actual_min": min(first["actual_min"], second["actual_min"]),
+        "actual_max": max(first["actual_max"], second["actual_max"]),
+        "actual_mean": (
+            first["actual_mean"] * first["samples"]
+            + second["actual_mean"] * second["samples"]
+        )
+        / samples,
+    }
+
+
+class TemperatureRollups:
+    def __init__(
+        self,
+        data_dir: str,
+        controller_id: str = "default",
+        tiers: tuple[int, ...] = ROLLUP_TIERS,
+    ):
+        self.data_dir = os.path.join(data_dir, controller_id)
+        self.tiers = tuple(sorted(tiers))
+        self._open_buckets: dict[int, RollupBucket] = {}
+
+    def _bucket_start(self, timestamp: datetime, tier: int) -> datetime:
+        seconds = int(timestamp.timestamp())
+        return datetime.fromtimestamp(seconds - seconds % tier)
+
+    def _tier_file(self, tier: int, day: datetime) -> str:
+        return os.path.join(self.data_dir, f"{tier}s", f"{day:%Y%m%d}.csv")
+
+    def _write_bucket(self, tier: int, bucket: RollupBucket) -> None:
+        file_path = self._tier_file(tier, bucket.start)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        write_header = not os.path.exists(file_path)
+        try:
+            with open(file_path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=ROLLUP_FIELDNAMES)
+                if write_header:
+                    writer.writeheader()
+                writer.writerow(bucket.to_record())
+        except Exception as e:
+            logger.error(f"Error writing {tier}s rollup: {e}")
+            raise
+
+    def add(self, timestamp: datetime, setpoint: float, actual: float) -> None:
+        seconds = int(timestamp.timestamp())
+        for tier in self.tiers:
+            bucket = self._open_buckets.get(tier)
+            if bucket is None or not 0 <= seconds - bucket.epoch < tier:
+                if bucket is not None:
+                    self._write_bucket(tier, bucket)
+                start = seconds - seconds % tier
+                bucket = RollupBucket(datetime.fromtimestamp(start), epoch=start)
+                self._open_buckets[tier] = bucket
+            bucket.add(setpoint, actual)
+
+    def flush(self) -> None:
+        # Partially filled buckets are written now and merged at query time
+        # with any later record for the same bucket
+        for tier, bucket in self._open_buckets.items():
+            self._write_bucket(tier, bucket)
+        self._open_buckets.clear()
+
+    def select_tier(self, resolution: int) -> int:
+        eligible = [tier for tier in self.tiers if tier <= resolution]
+        return eligible[-1] if eligible else self.tiers[0]
+
+    def _read_tier_file(self, file_path: str) -> list[RollupRecord]:
+        if not os.path.exists(file_path):
+            return []
+        with open(file_path, "r", newline="") as f:
+            return [
+                {
+                    "timestamp": row["timestamp"],
+                    "samples": int(row["samples"]),
+                    **{
+                        key: float(row[key])
+                        for key in ROLLUP_FIELDNAMES
+                        if key not in ("timestamp", "samples")
+                    },
+                }
+                for row in csv.DictReader(f)
+            ]
+
+    def query(
+        self, start: datetime, end: datetime, resolution: int
+    ) -> tuple[int, list[RollupRecord]]:
+        # Records carry naive local timestamps; an aware bound such as
+        # ...T00:00:00Z would not compare with them
+        start, end = _to_local_naive(start), _to_local_naive(end)
+        tier = self.select_tier(resolution)
+        records: dict[str, RollupRecord] = {}
+
+        candidates: list[RollupRecord] = []
+        day = self._bucket_start(start, tier).replace(hour=0, minute=0, second=0)
+        while day <= end:
+            candidates.extend(self._read_tier_file(self._tier_file(tier, day)))
+            day += timedelta(days=1)
+        if tier in self._open_buckets:
+            candidates.append(self._open_buckets[tier].to_record())
+
+        for record in candidates:
+            timestamp = datetime.fromisoformat(record["timestamp"])
+            if timestamp + timedelta(seconds=tier) <= start or timestamp >= end:
+                continue
+            key = record["timestamp"]
+            records[key] = (
+                _merge_records(records[key], record) if key in records else record
+            )
+
+        return tier, [records[key] for key in sorted(records)]
@@ -0,0 +1,22 @@
+import math
+
+
+class ThermalPlant:
+    def __init__(
+        self,
+        temperature: float = 20.0,
+        setpoint: float = 0.0,
+        time_constant: float = 30.0,
+    ):
+        self.temperature = temperature
+        self.setpoint = setpoint
+        self.time_constant = time_constant
+
+    def advance(self, seconds: float) -> float:
+        # Exact step response of a first-order lag, stable for any step size
+        if seconds > 0:
+            decay = math.exp(-seconds / self.time_constant)
+            self.temperature = (
+                self.setpoint + (self.temperature - self.setpoint) * decay
+            )
+        return self.temperature
@@ -0,0 +1,68 @@
+import json
+import struct
+import sys
+from array import array
+
+MESSAGE_TELEMETRY = 0x01
+MESSAGE_BACKFILL = 0x02
+MESSAGE_JSON = 0x03
+
+# type, device index, timestamp, setpoint, actual, device status
+TELEMETRY_STRUCT = struct.Struct("<BHdffB")
+# type, device index, sample count, then timestamps (f64), setpoints and
+# actuals (f32) as little-endian columns
+BACKFILL_HEADER_STRUCT = struct.Struct("<BHI")
+
+DEVICE_STATUS_OK = 0
+DEVICE_STATUS_ERROR = 1
+DEVICE_STATUS_DISCONNECTED = 2
+
+
+def _device_status_code(status: str) -> int:
+    if status == "OK":
+        return DEVICE_STATUS_OK
+    if status == "Disconnected":
+        return DEVICE_STATUS_DISCONNECTED
+    return DEVICE_STATUS_ERROR
+
+
+def _little_endian_bytes(typecode: str, values: list[float]) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def encode_telemetry(device_index: int, sample: dict) -> bytes:
+    return TELEMETRY_STRUCT.pack(
+        MESSAGE_TELEMETRY,
+        device_index,
+        sample["timestamp"],
+        sample["setpoint"],
+        sample["actual"],
+        _device_status_code(sample["status"]),
+    )
+
+
+def encode_backfill(device_index: int, backfill: dict) -> bytes:
+    return (
+        BACKFILL_HEADER_STRUCT.pack(
+            MESSAGE_BACKFILL, device_index, len(backfill["timestamps"])
+        )
+        + _little_endian_bytes("d", backfill["timestamps"])
+        + _little_endian_bytes("f", backfill["setpoint"])
+        + _little_endian_bytes("f", backfill["actual"])
+    )
+
+
+def encode_json(channel: str, message: dict) -> bytes:
+    payload = json.dumps({"channel": channel, "data": message}, separators=(",", ":"))
+    return bytes([MESSAGE_JSON]) + payload.encode()
+
+
+def encode_binary(channel: str, message: dict, device_indexes: dict[str, int]) -> bytes:
+    if channel in device_indexes:
+        if message.get("type") == "backfill":
+            return encode_backfill(device_indexes[channel], message)
+        return encode_telemetry(device_indexes[channel], message)
+    return encode_json(channel, message)